@@ -1,16 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
+import json
+import multiprocessing
 from datetime import datetime
-from collections import defaultdict
 
 from database import (
-    init_db, insert_expense, get_all_expenses,
-    get_expenses_by_date_range, delete_all_expenses
+    init_db, get_expenses_page, iter_expenses, count_expenses,
+    get_expense_aggregates, delete_all_expenses
 )
-from file_parser import parse_file
-from categorizer import categorize_expense, extract_provider, determine_person
-from insights import generate_insights
+from database import delete_expense as delete_expense_row
+from ingest import spool_upload, expand_zip, file_extension, SUPPORTED_EXTENSIONS
+from insights import generate_insights_from_aggregates
+import parse_cache
+import categorizer
+import merchant_cache
+import snapshot
+import jobs
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -19,17 +25,35 @@ CORS(app)  # Enable CORS for React frontend
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Uploads are spooled to disk and ingested in chunks, so large multi-year
+# exports are fine
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024 * 1024  # 1GB max file size
+
+# Page size for /api/expenses when a cursor but no limit is given, and the
+# largest allowed
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
     return jsonify({'status': 'ok', 'message': 'Expense Tracker API is running'})
 
+def _remove_spooled(files):
+    """Delete spooled uploads that no job took ownership of."""
+    for path, _ in files:
+        if os.path.exists(path):
+            os.remove(path)
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """
     Upload and parse expense file (CSV, PDF, XLSX).
+
+    An optional ``sheets`` form field (comma-separated names) limits an
+    XLSX workbook to those sheets; by default every sheet is read.
+
+    Returns 202 with a job id right away; poll /api/jobs/<id> for the result.
     """
     try:
         if 'file' not in request.files:
@@ -39,74 +63,213 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
 
-        # Read file content
-        file_content = file.read()
-        filename = file.filename
+        # Spool the upload to disk; a background job parses and stores it
+        sheets = [name.strip() for name in request.form.get('sheets', '').split(',')
+                  if name.strip()]
 
-        # Parse file
+        path = spool_upload(file, app.config['UPLOAD_FOLDER'])
         try:
-            parsed_expenses = parse_file(file_content, filename)
-        except Exception as e:
-            return jsonify({'error': f'Error parsing file: {str(e)}'}), 400
+            job_id = jobs.submit_upload(path, file.filename, sheets=sheets or None)
+        except Exception:
+            _remove_spooled([(path, file.filename)])
+            raise
 
-        # Determine person from filename
-        person = determine_person(filename)
+        return jsonify({
+            'message': 'Upload queued',
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
 
-        # Process and store expenses
-        stored_count = 0
-        for expense in parsed_expenses:
-            # Auto-categorize
-            expense['category'] = categorize_expense(expense['description'])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            # Extract provider
-            expense['provider'] = extract_provider(expense['description'])
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Upload several expense files, or one ZIP archive of them.
 
-            # Set person
-            expense['person'] = person
+    Files are sent as repeated ``files`` fields. They are parsed in parallel
+    in a background job, each file's owner detected from its name, and
+    stored together in one transaction. Returns 202 with a job id; the job
+    result has per-file counts and timings.
+    """
+    try:
+        uploads = [f for f in request.files.getlist('files') if f.filename]
+        if not uploads:
+            return jsonify({'error': 'No files provided'}), 400
 
-            # Insert into database
-            insert_expense(expense)
-            stored_count += 1
+        folder = app.config['UPLOAD_FOLDER']
+        files = []
+        try:
+            for upload in uploads:
+                extension = file_extension(upload.filename)
+                if extension == 'zip':
+                    zip_path = spool_upload(upload, folder)
+                    try:
+                        files.extend(expand_zip(
+                            zip_path, folder, app.config['MAX_CONTENT_LENGTH']
+                        ))
+                    finally:
+                        os.remove(zip_path)
+                elif extension in SUPPORTED_EXTENSIONS:
+                    files.append((spool_upload(upload, folder), upload.filename))
+                else:
+                    raise ValueError(f"Unsupported file format: {extension}")
+        except ValueError as e:
+            _remove_spooled(files)
+            return jsonify({'error': str(e)}), 400
+        except Exception:
+            _remove_spooled(files)
+            raise
+
+        if not files:
+            return jsonify({'error': 'No supported files found'}), 400
 
+        try:
+            job_id = jobs.submit_batch(files)
+        except Exception:
+            _remove_spooled(files)
+            raise
         return jsonify({
-            'message': f'Successfully processed {stored_count} expenses',
-            'count': stored_count,
-            'person': person
-        }), 200
+            'message': f'{len(files)} files queued',
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
+@app.route('/api/recategorize', methods=['POST'])
+def recategorize():
+    """
+    Re-categorize expenses stored before the categorization rules changed.
+
+    Runs as a background job in short batches, so the dashboard stays
+    available. Returns 202 with a job id; the job counts the stale rows
+    (rows_total in its status) before it starts on them.
+    """
+    try:
+        job_id = jobs.submit_recategorize()
+        return jsonify({
+            'message': 'Re-categorization queued',
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    Status of a background job.
+
+    Reports status (queued, running, done or failed), rows processed,
+    throughput, and the result or error once the job has finished.
+    """
+    try:
+        status = jobs.job_status(job_id)
+        if status is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(status)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/expenses', methods=['GET'])
 def get_expenses():
     """
-    Get all expenses or filter by date range.
+    Get expenses, newest first: every matching expense, or one page at a time.
+
+    Without limit and cursor all matching expenses are returned, as before
+    pagination existed (next_cursor is then null).
+
+    Query parameters:
+        limit: page size (max MAX_PAGE_SIZE); enables paging
+        cursor: next_cursor from the previous page (page size
+            DEFAULT_PAGE_SIZE unless limit is given)
+        fields: comma-separated columns to return
+        start_date, end_date: inclusive ISO date bounds
+        person, category, provider: equality filters
+        include_total: '1' to also return the number of matching expenses
+        stream: '1' to stream every matching expense as NDJSON (also chosen
+            by 'Accept: application/x-ndjson'); limit and cursor are ignored
     """
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        filters = {
+            key: request.args.get(key)
+            for key in ('start_date', 'end_date', 'person', 'category', 'provider')
+        }
+        fields = request.args.get('fields')
+        fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+        if wants_ndjson():
+            try:
+                batches = iter_expenses(fields=fields, **filters)
+                # Run the generator up to its first batch now, so bad
+                # arguments still produce a 400 instead of a broken stream
+                first_batch = next(batches, [])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return Response(
+                stream_with_context(ndjson_lines(first_batch, batches)),
+                mimetype='application/x-ndjson'
+            )
 
-        if start_date and end_date:
-            expenses = get_expenses_by_date_range(start_date, end_date)
-        else:
-            expenses = get_all_expenses()
-
-        return jsonify({
+        try:
+            if 'limit' not in request.args and 'cursor' not in request.args:
+                expenses = [
+                    expense
+                    for batch in iter_expenses(fields=fields, **filters)
+                    for expense in batch
+                ]
+                next_cursor = None
+            else:
+                limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+                expenses, next_cursor = get_expenses_page(
+                    limit=limit,
+                    cursor=request.args.get('cursor'),
+                    fields=fields,
+                    **filters
+                )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        response = {
             'expenses': expenses,
-            'count': len(expenses)
-        }), 200
+            'count': len(expenses),
+            'next_cursor': next_cursor
+        }
+        if request.args.get('include_total') == '1':
+            response['total'] = count_expenses(**filters)
+
+        return jsonify(response), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def wants_ndjson():
+    """Whether the client asked for a streamed NDJSON expense listing."""
+    if request.args.get('stream') == '1':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+def ndjson_lines(first_batch, batches):
+    """Serialize expense batches to NDJSON, one chunk per batch."""
+    if first_batch:
+        yield ''.join(json.dumps(row) + '\n' for row in first_batch)
+    for batch in batches:
+        yield ''.join(json.dumps(row) + '\n' for row in batch)
+
 @app.route('/api/insights', methods=['GET'])
 def get_insights():
     """
     Generate and return insights from expense data.
     """
     try:
-        expenses = get_all_expenses()
-        insights = generate_insights(expenses)
+        insights = generate_insights_from_aggregates(get_expense_aggregates())
 
         return jsonify(insights), 200
 
@@ -119,91 +282,52 @@ def get_analytics():
     Get analytics data for visualizations.
     """
     try:
-        expenses = get_all_expenses()
-
-        # Monthly aggregation for line chart
-        monthly_data = defaultdict(lambda: {'credit': 0, 'debit': 0})
-
-        # Category aggregation for stacked bar chart
-        category_monthly = defaultdict(lambda: defaultdict(float))
-
-        # Person aggregation for donut chart
-        person_data = defaultdict(lambda: {'credit': 0, 'debit': 0})
-
-        # Provider aggregation for pie chart
-        provider_data = defaultdict(lambda: {'credit': 0, 'debit': 0})
-
-        # Category totals for heatmap
-        category_totals = defaultdict(lambda: {'debit': 0, 'count': 0})
+        aggregates = get_expense_aggregates()
 
-        for expense in expenses:
-            date_obj = datetime.strptime(expense['date'], '%Y-%m-%d')
-            month_key = date_obj.strftime('%Y-%m')
-            month_name = date_obj.strftime('%B %Y')
-
-            credit = float(expense.get('credit', 0))
-            debit = float(expense.get('debit', 0))
-            category = expense.get('category', 'miscellaneous')
-            person = expense.get('person', 'Unknown')
-            provider = expense.get('provider', 'Unknown')
-
-            # Monthly totals
-            monthly_data[month_key]['credit'] += credit
-            monthly_data[month_key]['debit'] += debit
-            monthly_data[month_key]['month'] = month_name
-
-            # Category by month
-            category_monthly[month_key][category] += debit
-
-            # Person totals
-            person_data[person]['credit'] += credit
-            person_data[person]['debit'] += debit
-
-            # Provider totals
-            provider_data[provider]['credit'] += credit
-            provider_data[provider]['debit'] += debit
-
-            # Category totals
-            category_totals[category]['debit'] += debit
-            category_totals[category]['count'] += 1
+        month_names = {
+            row['month']: datetime.strptime(row['month'], '%Y-%m').strftime('%B %Y')
+            for row in aggregates['monthly']
+        }
 
         # Format monthly data for charts
         monthly_chart_data = [
             {
-                'month': v['month'],
-                'monthKey': k,
-                'credit': v['credit'],
-                'debit': v['debit']
+                'month': month_names[row['month']],
+                'monthKey': row['month'],
+                'credit': row['credit'],
+                'debit': row['debit']
             }
-            for k, v in sorted(monthly_data.items())
+            for row in aggregates['monthly']
         ]
 
-        # Format category monthly data
-        category_chart_data = []
-        for month_key in sorted(category_monthly.keys()):
-            month_data = {
-                'month': monthly_data[month_key]['month'],
-                'monthKey': month_key
-            }
-            for category, amount in category_monthly[month_key].items():
-                month_data[category] = amount
-            category_chart_data.append(month_data)
+        # Format category monthly data (rows arrive sorted by month)
+        category_monthly = {}
+        for row in aggregates['category_monthly']:
+            month_data = category_monthly.setdefault(row['month'], {
+                'month': month_names[row['month']],
+                'monthKey': row['month']
+            })
+            month_data[row['category']] = row['debit']
+        category_chart_data = list(category_monthly.values())
 
         # Format person data
         person_chart_data = [
-            {'person': k, **v}
-            for k, v in person_data.items()
+            {'person': row['person'], 'credit': row['credit'], 'debit': row['debit']}
+            for row in aggregates['by_person']
         ]
 
         # Format provider data
         provider_chart_data = [
-            {'provider': k, **v}
-            for k, v in provider_data.items()
+            {'provider': row['provider'], 'credit': row['credit'], 'debit': row['debit']}
+            for row in aggregates['by_provider']
         ]
 
         # Format category totals (sorted by debit for heatmap)
         category_chart_totals = sorted(
-            [{'category': k, **v} for k, v in category_totals.items()],
+            [
+                {'category': row['category'], 'debit': row['debit'], 'count': row['count']}
+                for row in aggregates['by_category']
+            ],
             key=lambda x: x['debit'],
             reverse=True
         )[:10]  # Top 10 categories
@@ -214,7 +338,7 @@ def get_analytics():
             'byPerson': person_chart_data,
             'byProvider': provider_chart_data,
             'categoryTotals': category_chart_totals,
-            'totalExpenses': len(expenses)
+            'totalExpenses': aggregates['total_count']
         }), 200
 
     except Exception as e:
@@ -224,11 +348,44 @@ def get_analytics():
 def delete_expense(expense_id):
     """Delete a specific expense."""
     try:
-        # Implementation for deleting single expense
+        if not delete_expense_row(expense_id):
+            return jsonify({'error': 'Expense not found'}), 404
         return jsonify({'message': 'Expense deleted'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/expenses/<int:expense_id>', methods=['PATCH'])
+def update_expense_category(expense_id):
+    """
+    Correct an expense's category.
+
+    Expects JSON {"category": ...}. The category is marked as confirmed:
+    re-categorization keeps it and the learned categorizer trains on it.
+    Later uploads of the same merchant get it too.
+    """
+    try:
+        category = (request.get_json(silent=True) or {}).get('category')
+        categories = [*categorizer.CATEGORY_KEYWORDS, 'miscellaneous']
+        if category not in categories:
+            return jsonify({
+                'error': f"Unknown category: {category}",
+                'categories': categories
+            }), 400
+        if not merchant_cache.confirm_category(expense_id, category):
+            return jsonify({'error': 'Expense not found'}), 404
+        snapshot.invalidate_snapshot()
+        return jsonify({'message': 'Category updated', 'category': category}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/parse-cache', methods=['GET'])
+def parse_cache_stats():
+    """Hit/miss counters and disk usage of the parse result cache."""
+    try:
+        return jsonify(parse_cache.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/expenses/clear', methods=['DELETE'])
 def clear_expenses():
     """Clear all expenses (for testing)."""
@@ -238,6 +395,26 @@ def clear_expenses():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _runs_jobs():
+    """
+    Whether this process should run background jobs.
+
+    Not in the debug reloader's watcher process (it only restarts the
+    serving child) nor in PDF worker processes, which import this module
+    again when started from ``python app.py``.
+    """
+    if multiprocessing.parent_process() is not None:
+        return False
+    return __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+# Create the schema and start the job runner when the app is created,
+# whichever server imports it (each worker of a multi-process server runs
+# one). Queued jobs are picked up right away; jobs a crashed process was
+# running once their lease expires (see jobs.LEASE_SECONDS)
+if _runs_jobs():
+    init_db()
+    jobs.start()
+
 if __name__ == '__main__':
     # Initialize database
     init_db()
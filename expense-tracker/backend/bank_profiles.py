@@ -0,0 +1,206 @@
+"""
+Registry of known bank statement formats.
+
+A profile maps one bank export's columns to the statement columns and
+records its date format and sign convention, so uploads in a known format
+skip column detection and date-format inference. Profiles are keyed by a
+fingerprint of the normalized header row. Built-in profiles live in
+BUILTIN_PROFILES; profiles saved with save_profile() are kept in
+SAVED_PROFILES_PATH.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+SAVED_PROFILES_PATH = os.path.join(os.path.dirname(__file__), 'bank_profiles.json')
+
+# Sign conventions
+SIGN_SPLIT = 'split'                    # separate credit and debit columns
+SIGN_NEGATIVE_DEBIT = 'negative_debit'  # one amount column, charges negative
+SIGN_POSITIVE_DEBIT = 'positive_debit'  # one amount column, charges positive
+SIGN_CONVENTIONS = (SIGN_SPLIT, SIGN_NEGATIVE_DEBIT, SIGN_POSITIVE_DEBIT)
+
+# Profile keys naming header columns
+PROFILE_COLUMNS = ('date', 'description', 'credit', 'debit', 'amount')
+
+BUILTIN_PROFILES = [
+    {
+        'name': 'Amex (US)',
+        'header': ['date', 'description', 'card member', 'account #', 'amount'],
+        'date': 'date', 'description': 'description', 'amount': 'amount',
+        'date_format': '%m/%d/%Y', 'sign': SIGN_POSITIVE_DEBIT,
+    },
+    {
+        'name': 'Amex (US, extended details)',
+        'header': [
+            'date', 'description', 'card member', 'account #', 'amount',
+            'extended details', 'appears on your statement as', 'address',
+            'city/state', 'zip code', 'country', 'reference', 'category'
+        ],
+        'date': 'date', 'description': 'description', 'amount': 'amount',
+        'date_format': '%m/%d/%Y', 'sign': SIGN_POSITIVE_DEBIT,
+    },
+    {
+        'name': 'Amex (AU)',
+        'header': [
+            'date', 'date processed', 'description', 'card member', 'account #',
+            'amount'
+        ],
+        'date': 'date', 'description': 'description', 'amount': 'amount',
+        'date_format': '%d/%m/%Y', 'sign': SIGN_POSITIVE_DEBIT,
+    },
+    {
+        'name': 'Bankwest',
+        'header': [
+            'bsb number', 'account number', 'transaction date', 'narration',
+            'cheque number', 'debit', 'credit', 'balance', 'transaction type'
+        ],
+        'date': 'transaction date', 'description': 'narration',
+        'credit': 'credit', 'debit': 'debit',
+        'date_format': '%d/%m/%Y', 'sign': SIGN_SPLIT,
+    },
+    {
+        'name': 'Chase (credit card)',
+        'header': [
+            'transaction date', 'post date', 'description', 'category', 'type',
+            'amount', 'memo'
+        ],
+        'date': 'transaction date', 'description': 'description', 'amount': 'amount',
+        'date_format': '%m/%d/%Y', 'sign': SIGN_NEGATIVE_DEBIT,
+    },
+    {
+        'name': 'Chase (checking)',
+        'header': [
+            'details', 'posting date', 'description', 'amount', 'type', 'balance',
+            'check or slip #'
+        ],
+        'date': 'posting date', 'description': 'description', 'amount': 'amount',
+        'date_format': '%m/%d/%Y', 'sign': SIGN_NEGATIVE_DEBIT,
+    },
+]
+
+# Placeholder names pandas and the XLSX reader give blank header cells
+_UNNAMED = re.compile(r'unnamed: \d+$')
+
+_lock = threading.Lock()
+_profiles = None    # fingerprint -> profile
+_version = None     # hash of every registered profile
+
+def normalize_header(columns):
+    """
+    Normalize header names for fingerprinting.
+
+    Names are lowercased with whitespace collapsed; blank (unnamed) columns,
+    such as those left by a trailing comma, are dropped.
+    """
+    names = (' '.join(str(column).lower().split()) for column in columns)
+    return [name for name in names if name and not _UNNAMED.match(name)]
+
+def header_fingerprint(columns):
+    """Fingerprint of a header row, independent of case and blank columns."""
+    key = '\x1f'.join(normalize_header(columns))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def validate_profile(profile):
+    """Raise ValueError if a profile is incomplete or inconsistent."""
+    header = normalize_header(profile.get('header', []))
+    if not profile.get('name'):
+        raise ValueError("Profile needs a name")
+    if profile.get('sign') not in SIGN_CONVENTIONS:
+        raise ValueError(f"Unknown sign convention: {profile.get('sign')}")
+    required = ['date', 'description']
+    if profile['sign'] == SIGN_SPLIT:
+        if not profile.get('credit') and not profile.get('debit'):
+            raise ValueError("A split profile needs a credit or debit column")
+    else:
+        required.append('amount')
+    for key in required:
+        if not profile.get(key):
+            raise ValueError(f"Profile is missing its {key} column")
+    for key in PROFILE_COLUMNS:
+        if profile.get(key) and profile[key] not in header:
+            raise ValueError(f"Profile {key} column '{profile[key]}' is not in its header")
+
+def _read_saved(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load_profiles(path=None):
+    """
+    (Re)build the registry from the built-in and saved profiles.
+
+    Saved profiles take precedence over built-in ones with the same header.
+
+    Returns:
+        dict: fingerprint -> profile
+    """
+    global _profiles, _version
+    profiles = {}
+    for profile in BUILTIN_PROFILES + _read_saved(path or SAVED_PROFILES_PATH):
+        profile = dict(profile, header=normalize_header(profile['header']))
+        profiles[header_fingerprint(profile['header'])] = profile
+
+    digest = hashlib.sha1(
+        json.dumps(sorted(profiles.items()), sort_keys=True).encode('utf-8')
+    ).hexdigest()[:8]
+    with _lock:
+        _profiles, _version = profiles, digest
+    return profiles
+
+def _registry():
+    if _profiles is None:
+        load_profiles()
+    return _profiles
+
+def registry_version():
+    """Short hash of the registered profiles; changes when one is saved."""
+    _registry()
+    return _version
+
+def find_profile(columns):
+    """
+    Look up the profile for a header row.
+
+    Returns:
+        dict: The matching profile, or None for an unknown format
+    """
+    return _registry().get(header_fingerprint(columns))
+
+def list_profiles():
+    """All registered profiles, sorted by name."""
+    return sorted(_registry().values(), key=lambda profile: profile['name'])
+
+def save_profile(profile, path=None):
+    """
+    Register a profile and store it in the saved profiles file.
+
+    Replaces any saved profile with the same header.
+
+    Args:
+        profile (dict): name, header, date/description/credit/debit/amount
+            column names, date_format and sign
+
+    Returns:
+        str: The header fingerprint the profile is registered under
+    """
+    path = path or SAVED_PROFILES_PATH
+    profile = dict(profile, header=normalize_header(profile['header']))
+    validate_profile(profile)
+    fingerprint = header_fingerprint(profile['header'])
+
+    saved = [
+        existing for existing in _read_saved(path)
+        if header_fingerprint(existing['header']) != fingerprint
+    ]
+    saved.append(profile)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp_path, path)
+
+    load_profiles(path)
+    return fingerprint
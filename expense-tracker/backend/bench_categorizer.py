@@ -0,0 +1,62 @@
+import sys
+import os
+import tempfile
+import timeit
+
+# Add current directory to path so we can import file_parser and categorizer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import file_parser
+import categorizer
+import learned_categorizer
+
+text_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf_text.txt')
+repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+with open(text_path, encoding='utf-8') as f:
+    sample = f.read()
+
+# Descriptions of the sample statement, repeated up to a multi-year statement
+year_ctx = file_parser._statement_year(sample)
+descriptions = [
+    expense['description'] for expense in file_parser._parse_statement_text(sample, year_ctx)
+] * repeats
+
+print(f"Benchmarking categorizer on {len(descriptions)} descriptions "
+      f"({repeats} x {os.path.basename(text_path)})")
+
+def naive(description):
+    """Keyword-by-keyword substring scan, for comparison."""
+    description_lower = description.lower()
+    for category, keywords in categorizer.CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in description_lower:
+                return category
+    return 'miscellaneous'
+
+runs = 5
+for name, func in (
+    ('substring scan (categorize only)', naive),
+    ('categorize_expense', categorizer.categorize_expense),
+    ('classify_expense (category + provider)', categorizer.classify_expense),
+):
+    best = min(timeit.repeat(
+        lambda: [func(description) for description in descriptions], number=1, repeat=runs
+    ))
+    print(f"{name}: best of {runs}: {best * 1000:.1f} ms "
+          f"({best / len(descriptions) * 1e6:.2f} us/row)")
+
+# Learned fallback tier: a throwaway model trained on the keyword categories
+unique = list(dict.fromkeys(descriptions))
+with tempfile.TemporaryDirectory() as model_dir:
+    learned_categorizer.MODEL_DIR = model_dir
+    learned_categorizer.save_model(
+        learned_categorizer.train(unique, categorizer.categorize_many(unique)), model_dir
+    )
+    learned_categorizer.predict_many(unique)  # map the model before timing
+    best = min(timeit.repeat(
+        lambda: learned_categorizer.predict_many(descriptions), number=1, repeat=runs
+    ))
+per_row = best / len(descriptions) * 1e6
+print(f"learned predict_many (one batch): best of {runs}: {best * 1000:.1f} ms "
+      f"({per_row:.2f} us/row, budget {learned_categorizer.PREDICT_BUDGET_US} us/row)")
@@ -0,0 +1,31 @@
+import sys
+import os
+import timeit
+
+# Add current directory to path so we can import file_parser
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import file_parser
+
+text_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf_text.txt')
+repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+with open(text_path, encoding='utf-8') as f:
+    sample = f.read()
+
+# Scale the extracted statement text up to a multi-year statement
+text = sample * repeats
+line_count = text.count('\n')
+year_ctx = file_parser._statement_year(text)
+
+print(f"Benchmarking statement line scanner on {line_count} lines "
+      f"({repeats} x {os.path.basename(text_path)})")
+
+expenses = file_parser._parse_statement_text(text, year_ctx)
+print(f"Transactions per pass: {len(expenses)}")
+
+runs = 5
+best = min(timeit.repeat(
+    lambda: file_parser._parse_statement_text(text, year_ctx), number=1, repeat=runs
+))
+print(f"Best of {runs}: {best * 1000:.1f} ms ({line_count / best:,.0f} lines/s)")
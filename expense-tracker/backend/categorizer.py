@@ -1,4 +1,7 @@
-import re
+import hashlib
+import json
+
+import pandas as pd
 
 # Category keywords mapping
 CATEGORY_KEYWORDS = {
@@ -58,26 +61,194 @@ CATEGORY_KEYWORDS = {
     'miscellaneous': []
 }
 
+# Card providers recognized in descriptions (first match wins)
+CARD_PROVIDERS = {
+    'amex': 'AMEX',
+    'american express': 'AMEX',
+    'bankwest': 'Bankwest',
+    'chase': 'Chase',
+    'visa': 'Visa',
+    'mastercard': 'Mastercard',
+    'discover': 'Discover'
+}
+
+# Keywords that only match as whole words ('bar' should not match 'barber',
+# 'bus' not 'business')
+WORD_BOUNDARY_KEYWORDS = {'bar', 'pub', 'bp', 'bus', 'gas', 'mall', 'toll'}
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over prioritized keyword tables.
+
+    Built once from tables of (keyword, priority) pairs; match() then finds,
+    for every table, the lowest-priority keyword occurring in a text in one
+    pass over it, however many keywords there are. Keywords in
+    ``word_boundary`` only match when not surrounded by letters or digits.
+    """
+
+    def __init__(self, tables, word_boundary=()):
+        self._table_count = len(tables)
+        # transitions[state]: char -> next state, with failure links folded
+        # in so matching never backtracks (a DFA)
+        transitions = [{}]
+        # (table, priority) of the plain keywords ending at each state, and
+        # (table, priority, length) of the whole-word keywords ending there
+        plain = [()]
+        bounded = [()]
+
+        for table, keywords in enumerate(tables):
+            for keyword, priority in keywords:
+                state = 0
+                for char in keyword:
+                    nxt = transitions[state].get(char)
+                    if nxt is None:
+                        nxt = len(transitions)
+                        transitions[state][char] = nxt
+                        transitions.append({})
+                        plain.append(())
+                        bounded.append(())
+                    state = nxt
+                if keyword in word_boundary:
+                    bounded[state] += ((table, priority, len(keyword)),)
+                else:
+                    plain[state] += ((table, priority),)
+
+        # Breadth-first: give each state the outputs of its failure state and
+        # the failure state's transitions it lacks
+        fail = [0] * len(transitions)
+        queue = list(transitions[0].values())
+        for state in queue:
+            failure = fail[state]
+            plain[state] += plain[failure]
+            bounded[state] += bounded[failure]
+            for char, nxt in transitions[state].items():
+                fail[nxt] = transitions[failure].get(char, 0)
+                queue.append(nxt)
+            for char, target in transitions[failure].items():
+                transitions[state].setdefault(char, target)
+
+        self._transitions = transitions
+        self._plain = [_best_per_table(outputs) for outputs in plain]
+        self._bounded = bounded
+
+    def match(self, text):
+        """
+        Lowest priority found in ``text`` for each table.
+
+        Returns:
+            list: Per table, the priority, or None if none of its keywords occur
+        """
+        transitions = self._transitions
+        plain_at = self._plain
+        bounded_at = self._bounded
+        result = [None] * self._table_count
+        state = 0
+        for end, char in enumerate(text, 1):
+            state = transitions[state].get(char, 0)
+            if not state:
+                continue
+            for table, priority in plain_at[state]:
+                best = result[table]
+                if best is None or priority < best:
+                    result[table] = priority
+            for table, priority, length in bounded_at[state]:
+                best = result[table]
+                if best is not None and priority >= best:
+                    continue
+                start = end - length
+                if (start == 0 or not text[start - 1].isalnum()) and \
+                        (end == len(text) or not text[end].isalnum()):
+                    result[table] = priority
+        return result
+
+def _best_per_table(outputs):
+    """Keep only the lowest priority per table of a state's outputs."""
+    best = {}
+    for table, priority in outputs:
+        if table not in best or priority < best[table]:
+            best[table] = priority
+    return tuple(best.items())
+
+# Tables of the rules matcher
+_CATEGORY_TABLE = 0
+_PROVIDER_TABLE = 1
+
+_category_names = []
+_provider_names = []
+_matcher = None
+
+# Hash of the rule tables the matcher was built from; anything derived from
+# the rules (e.g. the merchant cache) is stale once it changes
+RULES_VERSION = None
+
+def reload_rules():
+    """
+    Rebuild the keyword matcher from CATEGORY_KEYWORDS, CARD_PROVIDERS and
+    WORD_BOUNDARY_KEYWORDS. Call after changing any of them.
+    """
+    global _category_names, _provider_names, _matcher, RULES_VERSION
+
+    category_names = list(CATEGORY_KEYWORDS)
+    provider_names = list(CARD_PROVIDERS.values())
+    matcher = KeywordMatcher([
+        [(keyword, priority) for priority, category in enumerate(category_names)
+         for keyword in CATEGORY_KEYWORDS[category]],
+        [(keyword, priority) for priority, keyword in enumerate(CARD_PROVIDERS)],
+    ], WORD_BOUNDARY_KEYWORDS)
+
+    rules = json.dumps(
+        [CATEGORY_KEYWORDS, CARD_PROVIDERS, sorted(WORD_BOUNDARY_KEYWORDS)]
+    )
+    _category_names, _provider_names, _matcher = category_names, provider_names, matcher
+    RULES_VERSION = hashlib.sha1(rules.encode('utf-8')).hexdigest()[:12]
+
+def classify_expense(description):
+    """
+    Categorize an expense and extract its provider in one pass.
+
+    Same results as categorize_expense() and extract_provider(), for half
+    the work when both are needed.
+
+    Args:
+        description (str): The expense description
+
+    Returns:
+        tuple: (category, provider)
+    """
+    category, provider = _matcher.match(description.lower())
+    return _category_name(category), _provider_name(provider, description)
+
+def _category_name(priority):
+    # Default to miscellaneous if no match found
+    if priority is None:
+        return 'miscellaneous'
+    return _category_names[priority]
+
+def _provider_name(priority, description):
+    if priority is not None:
+        return _provider_names[priority]
+
+    # If no card provider found, return first word as provider
+    words = description.split()
+    if words:
+        return words[0].title()
+
+    return 'Unknown'
+
 def categorize_expense(description):
     """
     Automatically categorize an expense based on its description.
 
+    Categories are tried in CATEGORY_KEYWORDS order: the first category
+    with a keyword in the description wins.
+
     Args:
         description (str): The expense description
 
     Returns:
         str: The categorized expense type
     """
-    description_lower = description.lower()
-
-    # Check each category for keyword matches
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in description_lower:
-                return category
-
-    # Default to miscellaneous if no match found
-    return 'miscellaneous'
+    return _category_name(_matcher.match(description.lower())[_CATEGORY_TABLE])
 
 def extract_provider(description):
     """
@@ -89,29 +260,62 @@ def extract_provider(description):
     Returns:
         str: The provider name (simplified)
     """
-    description_lower = description.lower()
+    priority = _matcher.match(description.lower())[_PROVIDER_TABLE]
+    return _provider_name(priority, description)
 
-    # Common card providers
-    card_providers = {
-        'amex': 'AMEX',
-        'american express': 'AMEX',
-        'bankwest': 'Bankwest',
-        'chase': 'Chase',
-        'visa': 'Visa',
-        'mastercard': 'Mastercard',
-        'discover': 'Discover'
-    }
+def _scatter(values, results):
+    """Map values through ``results``, as a list or an index-aligned Series."""
+    if isinstance(values, pd.Series):
+        return values.map(results)
+    return [results[value] for value in values]
 
-    for keyword, provider in card_providers.items():
-        if keyword in description_lower:
-            return provider
+def _as_text(descriptions):
+    """Descriptions with non-strings (None, NaN from pandas) replaced by ''."""
+    if isinstance(descriptions, pd.Series):
+        return descriptions.where(descriptions.map(lambda value: isinstance(value, str)), '')
+    return [value if isinstance(value, str) else '' for value in descriptions]
 
-    # If no card provider found, return first word as provider
-    words = description.split()
-    if words:
-        return words[0].title()
+def classify_many(descriptions):
+    """
+    classify_expense() over a whole column.
 
-    return 'Unknown'
+    Each distinct description is classified once and the results are
+    scattered back, so a statement costs one match per merchant string
+    rather than one per row. Missing descriptions (None or NaN) are treated
+    as empty.
+
+    Args:
+        descriptions (list or pd.Series): Expense descriptions
+
+    Returns:
+        tuple: (categories, providers), each a list, or a Series aligned
+        with ``descriptions`` when given a Series
+    """
+    descriptions = _as_text(descriptions)
+    unique = dict.fromkeys(descriptions)
+    categories = {}
+    providers = {}
+    for description in unique:
+        categories[description], providers[description] = classify_expense(description)
+    return _scatter(descriptions, categories), _scatter(descriptions, providers)
+
+def categorize_many(descriptions):
+    """
+    categorize_expense() over a whole column (see classify_many).
+
+    Returns:
+        list or pd.Series: Categories aligned with ``descriptions``
+    """
+    return classify_many(descriptions)[0]
+
+def extract_providers_many(descriptions):
+    """
+    extract_provider() over a whole column (see classify_many).
+
+    Returns:
+        list or pd.Series: Providers aligned with ``descriptions``
+    """
+    return classify_many(descriptions)[1]
 
 def determine_person(filename):
     """
@@ -132,3 +336,5 @@ def determine_person(filename):
     else:
         # Default to unknown, can be updated later
         return 'Unknown'
+
+reload_rules()
@@ -1,12 +1,456 @@
 import sqlite3
 from datetime import datetime
+from itertools import islice, repeat
+import base64
+import hashlib
+import json
 import os
+import threading
+import weakref
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'expenses.db')
 
+# Background job bookkeeping lives in its own file, so queueing, starting
+# and finishing a job never waits for an upload's insert transaction
+JOBS_DB_PATH = os.path.join(os.path.dirname(__file__), 'jobs.db')
+
+# Pragmas applied to every pooled connection. WAL lets dashboard reads run
+# while an upload is writing; NORMAL sync is safe under WAL and avoids an
+# fsync per commit.
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -64000),        # ~64MB page cache (negative = KiB)
+    ('mmap_size', 268435456),      # 256MB memory-mapped I/O
+    ('temp_store', 'MEMORY'),
+)
+
+# How long a writer waits for a lock held by another connection (seconds)
+BUSY_TIMEOUT = 30
+
+# Idle connections kept per database file for reuse by new threads
+POOL_SIZE = 8
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_idle = {}          # path -> list of idle connections
+_in_use = set()     # connections currently owned by a live thread
+
+def _open_connection(path):
+    """Open a new connection to ``path`` with the pool pragmas applied."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+def _release_connection(conn, path):
+    """Return a connection to the idle pool, or close it if the pool is full."""
+    with _pool_lock:
+        if conn not in _in_use:
+            return  # already closed by close_all_connections()
+        _in_use.discard(conn)
+        idle = _idle.setdefault(path, [])
+        if len(idle) < POOL_SIZE:
+            if conn.in_transaction:
+                conn.rollback()
+            idle.append(conn)
+            return
+    conn.close()
+
+class _ThreadConnection:
+    """
+    Owns a pooled connection for the lifetime of one thread.
+
+    Stored in thread-local storage, so it is garbage collected when its
+    thread exits and the connection goes back to the idle pool.
+    """
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+        self._finalizer = weakref.finalize(self, _release_connection, conn, path)
+
+    def release(self):
+        self._finalizer()
+
+# Rollup of expenses per (month, category, person, provider). Triggers on
+# expenses keep it in step with every insert, update and delete, so the
+# dashboard aggregates read O(months x groups) rows however large the
+# expenses table gets.
+ROLLUP_KEY = (
+    "substr({row}.date, 1, 7), {row}.category, {row}.person, "
+    "IFNULL({row}.provider, 'Unknown')"
+)
+
+_ROLLUP_ADD = '''
+    INSERT INTO expense_rollup (month, category, person, provider, credit, debit, count)
+    VALUES ({key}, IFNULL(NEW.credit, 0), IFNULL(NEW.debit, 0), 1)
+    ON CONFLICT (month, category, person, provider) DO UPDATE SET
+        credit = credit + excluded.credit,
+        debit = debit + excluded.debit,
+        count = count + 1;
+'''.format(key=ROLLUP_KEY.format(row='NEW'))
+
+_ROLLUP_OLD_KEY = (
+    "month = substr(OLD.date, 1, 7) AND category = OLD.category "
+    "AND person = OLD.person AND provider = IFNULL(OLD.provider, 'Unknown')"
+)
+
+_ROLLUP_SUBTRACT = f'''
+    UPDATE expense_rollup SET
+        credit = credit - IFNULL(OLD.credit, 0),
+        debit = debit - IFNULL(OLD.debit, 0),
+        count = count - 1
+    WHERE {_ROLLUP_OLD_KEY};
+    DELETE FROM expense_rollup WHERE {_ROLLUP_OLD_KEY} AND count <= 0;
+'''
+
+ROLLUP_TRIGGERS = {
+    'expenses_rollup_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert
+        AFTER INSERT ON expenses
+        BEGIN {_ROLLUP_ADD} END''',
+    'expenses_rollup_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete
+        AFTER DELETE ON expenses
+        BEGIN {_ROLLUP_SUBTRACT} END''',
+    'expenses_rollup_update': f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_update
+        AFTER UPDATE OF date, category, person, provider, credit, debit ON expenses
+        BEGIN {_ROLLUP_SUBTRACT} {_ROLLUP_ADD} END''',
+}
+
+REBUILD_ROLLUP_SQL = [
+    'DELETE FROM expense_rollup',
+    f'''INSERT INTO expense_rollup (month, category, person, provider, credit, debit, count)
+        SELECT {ROLLUP_KEY.format(row='expenses')},
+               TOTAL(credit), TOTAL(debit), COUNT(*)
+        FROM expenses
+        GROUP BY 1, 2, 3, 4''',
+]
+
+def expense_fingerprint(expense, occurrence=0):
+    """
+    Hash the identifying fields of a transaction for duplicate detection.
+
+    The description is lowercased with whitespace collapsed and amounts are
+    rounded to cents, so the same transaction from two statements hashes the
+    same. ``occurrence`` numbers identical transactions within one upload
+    (two same-day coffees), so genuine repeats are kept while a re-upload of
+    the same statement is still recognised.
+    """
+    key = _fingerprint_key(
+        expense['date'], expense['description'], expense.get('credit'),
+        expense.get('debit'), expense['person']
+    )
+    return _fingerprint_hash(key, occurrence)
+
+def _fingerprint_key(date, description, credit, debit, person):
+    """Normalized identity of a transaction, before the occurrence number."""
+    return '|'.join([
+        str(date),
+        ' '.join(str(description).lower().split()),
+        f"{float(credit or 0):.2f}",
+        f"{float(debit or 0):.2f}",
+        str(person)
+    ])
+
+def _fingerprint_hash(key, occurrence):
+    return hashlib.sha1(f'{key}|{occurrence}'.encode('utf-8')).hexdigest()
+
+def _backfill_fingerprints(conn):
+    """Fingerprint rows stored before the fingerprint column existed."""
+    seen = {}
+    updates = []
+    cursor = conn.execute('''
+        SELECT id, date, description, credit, debit, person
+        FROM expenses ORDER BY id
+    ''')
+    for row in cursor:
+        key = _fingerprint_key(
+            row['date'], row['description'], row['credit'], row['debit'], row['person']
+        )
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        updates.append((_fingerprint_hash(key, occurrence), row['id']))
+    conn.executemany('UPDATE expenses SET fingerprint = ? WHERE id = ?', updates)
+
+def _move_jobs(conn):
+    """Copy the jobs table into the jobs database, keeping job ids."""
+    rows = conn.execute(
+        '''SELECT id, kind, status, params, rows_processed, result, error,
+                  created_at, started_at, finished_at
+           FROM jobs ORDER BY id'''
+    ).fetchall()
+    jobs_conn = get_jobs_connection()
+    with jobs_conn:
+        jobs_conn.executemany(
+            '''INSERT OR IGNORE INTO jobs
+               (id, kind, status, params, rows_processed, result, error,
+                created_at, started_at, finished_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [tuple(row) for row in rows]
+        )
+
+# Schema migrations, applied in order on top of the base table. Each step is
+# a list of SQL statements or callables taking the connection. The list
+# index + 1 is the schema version recorded in PRAGMA user_version, so only
+# ever append to this list.
+SCHEMA_MIGRATIONS = [
+    # 1: indexes for date ordering, per-dimension filters and aggregates.
+    # The per-dimension indexes carry credit/debit so GROUP BY person,
+    # category, provider or month is answered from an index alone.
+    [
+        'CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)',
+        '''CREATE INDEX IF NOT EXISTS idx_expenses_person_date
+           ON expenses (person, date, credit, debit)''',
+        '''CREATE INDEX IF NOT EXISTS idx_expenses_category_date
+           ON expenses (category, date, credit, debit)''',
+        '''CREATE INDEX IF NOT EXISTS idx_expenses_provider_date
+           ON expenses (provider, date, credit, debit)''',
+    ],
+    # 2: monthly rollup table, kept current by triggers
+    [
+        '''CREATE TABLE IF NOT EXISTS expense_rollup (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            person TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            credit REAL NOT NULL DEFAULT 0,
+            debit REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, category, person, provider)
+        ) WITHOUT ROWID''',
+        *ROLLUP_TRIGGERS.values(),
+        *REBUILD_ROLLUP_SQL,
+    ],
+    # 3: per-transaction fingerprint so re-uploads are ignored at insert time
+    [
+        'ALTER TABLE expenses ADD COLUMN fingerprint TEXT',
+        _backfill_fingerprints,
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_fingerprint
+           ON expenses (fingerprint)''',
+    ],
+    # 4: background jobs (uploads), so queued work survives a restart (moved
+    # to the jobs database by 8)
+    [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            params TEXT NOT NULL DEFAULT '{}',
+            rows_processed INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)',
+    ],
+    # 5: category/provider per normalized merchant, tagged with the rules
+    # version that produced them
+    [
+        '''CREATE TABLE IF NOT EXISTS merchant_cache (
+            merchant TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            rules_version TEXT NOT NULL
+        ) WITHOUT ROWID''',
+    ],
+    # 6: categorizer rules version each row was categorized with; existing
+    # rows are NULL, i.e. due for re-categorization
+    [
+        'ALTER TABLE expenses ADD COLUMN rules_version TEXT',
+    ],
+    # 7: categories set by a user; training data for the learned categorizer,
+    # never overwritten by re-categorization
+    [
+        'ALTER TABLE expenses ADD COLUMN category_confirmed INTEGER NOT NULL DEFAULT 0',
+    ],
+    # 8: jobs moved to the jobs database (see JOBS_SCHEMA_MIGRATIONS)
+    [
+        _move_jobs,
+        'DROP TABLE jobs',
+    ],
+    # 9: per-dimension indexes ordered (dimension, date, id) so filtered
+    # keyset pages (ORDER BY date DESC, id DESC) need no sort; credit/debit
+    # follow id so the aggregates stay covered
+    [
+        'DROP INDEX IF EXISTS idx_expenses_person_date',
+        '''CREATE INDEX idx_expenses_person_date
+           ON expenses (person, date, id, credit, debit)''',
+        'DROP INDEX IF EXISTS idx_expenses_category_date',
+        '''CREATE INDEX idx_expenses_category_date
+           ON expenses (category, date, id, credit, debit)''',
+        'DROP INDEX IF EXISTS idx_expenses_provider_date',
+        '''CREATE INDEX idx_expenses_provider_date
+           ON expenses (provider, date, id, credit, debit)''',
+    ],
+]
+
+# Schema migrations of the jobs database, versioned the same way
+JOBS_SCHEMA_MIGRATIONS = [
+    # 1: background jobs (uploads, re-categorization)
+    [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            params TEXT NOT NULL DEFAULT '{}',
+            rows_processed INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)',
+    ],
+    # 2: the process running a job and until when it holds it, so a job is
+    # only taken back from processes that stopped renewing their lease
+    [
+        'ALTER TABLE jobs ADD COLUMN owner TEXT',
+        'ALTER TABLE jobs ADD COLUMN lease_expires_at REAL',
+    ],
+]
+
+# Columns a caller may request from the expense listing
+EXPENSE_FIELDS = (
+    'id', 'date', 'description', 'category', 'credit', 'debit',
+    'person', 'provider', 'created_at'
+)
+
+# Equality filters accepted by the expense listing (column names)
+EXPENSE_FILTERS = ('person', 'category', 'provider')
+
+# SQL of the listing queries issued by get_expenses_page() (with LIMIT) and
+# iter_expenses(), for the plan checks below
+_LISTING_SQL = (
+    f"SELECT {', '.join(EXPENSE_FIELDS)} FROM expenses {{where}} "
+    "ORDER BY date DESC, id DESC"
+)
+_CURSOR_CLAUSE = 'date <= ? AND (date < ? OR id < ?)'
+_CURSOR_PARAMS = ('2024-06-01', '2024-06-01', 1000)
+
+# Queries on the request path that must be served from an index, without
+# sorting rows the index could have returned in order
+HOT_QUERIES = {
+    'all_by_date': (_LISTING_SQL.format(where=''), ()),
+    'date_range': (
+        _LISTING_SQL.format(where='WHERE date >= ? AND date <= ?'),
+        ('2024-01-01', '2024-12-31')
+    ),
+    'person_by_date': (_LISTING_SQL.format(where='WHERE person = ?'), ('Soo',)),
+    'category_by_date': (_LISTING_SQL.format(where='WHERE category = ?'), ('dining',)),
+    'provider_by_date': (_LISTING_SQL.format(where='WHERE provider = ?'), ('AMEX',)),
+    'person_date_range': (
+        _LISTING_SQL.format(where='WHERE date >= ? AND date <= ? AND person = ?'),
+        ('2024-01-01', '2024-12-31', 'Soo')
+    ),
+    'page_by_date': (
+        _LISTING_SQL.format(where=f'WHERE {_CURSOR_CLAUSE}') + ' LIMIT 101',
+        _CURSOR_PARAMS
+    ),
+    'person_page_by_date': (
+        _LISTING_SQL.format(where=f'WHERE person = ? AND {_CURSOR_CLAUSE}') + ' LIMIT 101',
+        ('Soo', *_CURSOR_PARAMS)
+    ),
+    'category_page_by_date': (
+        _LISTING_SQL.format(where=f'WHERE category = ? AND {_CURSOR_CLAUSE}') + ' LIMIT 101',
+        ('dining', *_CURSOR_PARAMS)
+    ),
+    'provider_page_by_date': (
+        _LISTING_SQL.format(where=f'WHERE provider = ? AND {_CURSOR_CLAUSE}') + ' LIMIT 101',
+        ('AMEX', *_CURSOR_PARAMS)
+    ),
+    'person_date_range_page': (
+        _LISTING_SQL.format(
+            where=f'WHERE date >= ? AND date <= ? AND person = ? AND {_CURSOR_CLAUSE}'
+        ) + ' LIMIT 101',
+        ('2024-01-01', '2024-12-31', 'Soo', *_CURSOR_PARAMS)
+    ),
+    'count_by_person': ('SELECT COUNT(*) FROM expenses WHERE person = ?', ('Soo',)),
+    'monthly_totals': (
+        '''SELECT substr(date, 1, 7), SUM(credit), SUM(debit), COUNT(*)
+           FROM expenses GROUP BY substr(date, 1, 7)''',
+        ()
+    ),
+    'category_totals': (
+        'SELECT category, SUM(debit), COUNT(*) FROM expenses GROUP BY category', ()
+    ),
+}
+
+# Hot queries that read every row by design, and the plan line prefix their
+# scan must match. Aggregates over the whole table scan a covering index; the
+# unpaged listing returns every row, walking the date index to skip a sort.
+# Any other SCAN of expenses is reported by find_full_scans().
+FULL_SCANS_BY_DESIGN = {
+    'all_by_date': 'SCAN expenses USING INDEX idx_expenses_date',
+    'monthly_totals': 'SCAN expenses USING COVERING INDEX',
+    'category_totals': 'SCAN expenses USING COVERING INDEX idx_expenses_category_date',
+}
+
+def apply_migrations(conn, migrations=SCHEMA_MIGRATIONS):
+    """
+    Bring the schema up to the latest version in ``migrations``.
+
+    Returns:
+        int: The schema version after migrating
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, statements in enumerate(migrations[version:], start=version + 1):
+        with conn:
+            conn.execute('BEGIN')
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {target}')
+        version = target
+    return version
+
+def explain_query_plan(sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query."""
+    conn = get_connection()
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row['detail'] for row in rows]
+
+def find_full_scans(queries=None):
+    """
+    Check hot queries for full scans of the expenses table and for sorts.
+
+    Any SCAN of expenses counts, including a full walk of an index, unless
+    the query is listed in FULL_SCANS_BY_DESIGN and scans the way it says.
+    So does a temporary B-tree for ORDER BY: listing queries must read rows
+    in order from an index, or a page costs a sort of every matching row.
+
+    Args:
+        queries (dict): name -> (sql, params); defaults to HOT_QUERIES
+
+    Returns:
+        dict: name -> plan lines, for every query with an unexpected scan of
+        the expenses table or an ORDER BY sort (empty when all queries are
+        index-backed)
+    """
+    offenders = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = explain_query_plan(sql, params)
+        allowed = FULL_SCANS_BY_DESIGN.get(name)
+        if any(
+            (line.startswith('SCAN expenses')
+             and (allowed is None or not line.startswith(allowed)))
+            or (line.startswith('USE TEMP B-TREE') and 'ORDER BY' in line)
+            for line in plan
+        ):
+            offenders[name] = plan
+    return offenders
+
 def init_db():
     """Initialize the database with required tables."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Create expenses table
@@ -25,70 +469,849 @@ def init_db():
     ''')
 
     conn.commit()
-    conn.close()
+    # The jobs database first: migrating the main one may move jobs into it
+    apply_migrations(get_jobs_connection(), JOBS_SCHEMA_MIGRATIONS)
+    apply_migrations(conn)
 
-def get_connection():
-    """Get database connection."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def _thread_connection(path, slot):
+    """The calling thread's pooled connection to ``path``, kept in ``slot``."""
+    holder = getattr(_local, slot, None)
+    if holder is not None:
+        if holder.path == path and holder.conn in _in_use:
+            return holder.conn
+        # The path changed or the pool was closed underneath us
+        holder.release()
+
+    conn = None
+    with _pool_lock:
+        idle = _idle.get(path)
+        if idle:
+            conn = idle.pop()
+            _in_use.add(conn)
+    if conn is None:
+        conn = _open_connection(path)
+        with _pool_lock:
+            _in_use.add(conn)
+
+    setattr(_local, slot, _ThreadConnection(conn, path))
     return conn
 
-def insert_expense(expense_data):
-    """Insert a new expense into the database."""
+def get_connection():
+    """
+    Get the calling thread's pooled database connection.
+
+    Each thread keeps one open connection and reuses it for every call, and
+    connections left by finished threads are handed to new ones, so requests
+    no longer pay the connect/teardown cost. Callers must not close the
+    returned connection; use close_connection() instead.
+    """
+    return _thread_connection(DB_PATH, 'holder')
+
+def get_jobs_connection():
+    """Get the calling thread's pooled connection to the jobs database."""
+    return _thread_connection(JOBS_DB_PATH, 'jobs_holder')
+
+def close_connection():
+    """Return the calling thread's connections to the pool."""
+    for slot in ('holder', 'jobs_holder'):
+        holder = getattr(_local, slot, None)
+        if holder is not None:
+            setattr(_local, slot, None)
+            holder.release()
+
+def close_all_connections():
+    """Close every pooled connection (e.g. at shutdown)."""
+    with _pool_lock:
+        connections = list(_in_use)
+        for idle in _idle.values():
+            connections.extend(idle)
+        _in_use.clear()
+        _idle.clear()
+    for conn in connections:
+        conn.close()
+    _local.holder = _local.jobs_holder = None
+
+_INSERT_EXPENSE_SQL = '''
+    INSERT OR IGNORE INTO expenses
+        (date, description, category, credit, debit, person, provider,
+         rules_version, fingerprint)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Column order of the value tuples passed to _insert_rows()
+INSERT_COLUMNS = (
+    'date', 'description', 'category', 'credit', 'debit', 'person', 'provider',
+    'rules_version'
+)
+
+# INSERT_COLUMNS that may be left out (stored as NULL)
+OPTIONAL_INSERT_COLUMNS = ('rules_version',)
+
+def _expense_values(expense):
+    """Tuple of INSERT_COLUMNS values for an expense dictionary."""
+    return (
+        expense['date'],
+        expense['description'],
+        expense['category'],
+        expense.get('credit', 0),
+        expense.get('debit', 0),
+        expense['person'],
+        expense.get('provider', 'Unknown'),
+        expense.get('rules_version')
+    )
+
+def _insert_rows(values, batch_size, progress=None):
+    """
+    Fingerprint and insert INSERT_COLUMNS tuples in one transaction.
+
+    ``progress(rows_seen, rows_inserted)`` is called after every batch.
+    Nothing is committed until the end, so progress is only visible to the
+    caller (e.g. the job runner), not to other connections.
+
+    Returns:
+        tuple: (rows inserted, rows skipped as duplicates)
+    """
+    return _insert_groups([values], batch_size, progress)[0]
+
+def _insert_groups(groups, batch_size, progress=None):
+    """
+    Insert several streams of INSERT_COLUMNS tuples in one transaction.
+
+    Each group (e.g. one statement file) numbers its repeated transactions
+    separately, so the same transaction in two overlapping statements is
+    stored once, as it would be if they were uploaded one after the other.
+
+    Returns:
+        list: (rows inserted, rows skipped as duplicates) per group
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    def fingerprinted(values):
+        occurrences = {}
+        for row in values:
+            date, description, _, credit, debit, person = row[:6]
+            key = _fingerprint_key(date, description, credit, debit, person)
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            yield (*row, _fingerprint_hash(key, occurrence))
+
     conn = get_connection()
-    cursor = conn.cursor()
+    counts = []
+    total = 0
+    total_inserted = 0
+    try:
+        cursor = conn.cursor()
+        for values in groups:
+            rows = fingerprinted(values)
+            inserted = 0
+            seen = 0
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                cursor.executemany(_INSERT_EXPENSE_SQL, batch)
+                inserted += cursor.rowcount
+                seen += len(batch)
+                if progress is not None:
+                    progress(total + seen, total_inserted + inserted)
+            counts.append((inserted, seen - inserted))
+            total += seen
+            total_inserted += inserted
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
-    cursor.execute('''
-        INSERT INTO expenses (date, description, category, credit, debit, person, provider)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        expense_data['date'],
-        expense_data['description'],
-        expense_data['category'],
-        expense_data.get('credit', 0),
-        expense_data.get('debit', 0),
-        expense_data['person'],
-        expense_data.get('provider', 'Unknown')
-    ))
+    return counts
 
-    conn.commit()
-    expense_id = cursor.lastrowid
-    conn.close()
-    return expense_id
+def insert_expense(expense_data, occurrence=0):
+    """
+    Insert a new expense into the database.
 
-def get_all_expenses():
-    """Get all expenses from the database."""
+    A single row has no statement to number repeats against, so a second
+    identical transaction (same date, description, amounts and person) is
+    taken for a duplicate unless the caller passes its ``occurrence``: 0 for
+    the first, 1 for the second, and so on, as the bulk inserts do per file.
+
+    Args:
+        expense_data (dict): date, description, category, credit, debit,
+            person and optionally provider and rules_version
+        occurrence (int): Number of identical transactions before this one
+
+    Returns:
+        int: The new expense id, or None if it duplicates a stored expense
+    """
     conn = get_connection()
-    cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM expenses ORDER BY date DESC')
-    expenses = [dict(row) for row in cursor.fetchall()]
+    # The connection is reused, so roll back on failure instead of leaving
+    # an open transaction behind
+    with conn:
+        cursor = conn.execute(
+            _INSERT_EXPENSE_SQL,
+            (*_expense_values(expense_data), expense_fingerprint(expense_data, occurrence))
+        )
 
-    conn.close()
-    return expenses
+    return cursor.lastrowid if cursor.rowcount else None
+
+def insert_expenses_bulk(expenses, batch_size=1000):
+    """
+    Insert many expenses in a single transaction.
+
+    Rows are written with executemany in batches of ``batch_size``. If any
+    batch fails the whole transaction is rolled back, so a failed upload
+    never leaves part of a statement behind. Rows whose fingerprint is
+    already stored are skipped by the unique index.
+
+    Args:
+        expenses (iterable): Expense dictionaries (same keys as insert_expense)
+        batch_size (int): Number of rows sent to executemany at a time
+
+    Returns:
+        tuple: (rows inserted, rows skipped as duplicates)
+    """
+    return _insert_rows((_expense_values(expense) for expense in expenses), batch_size)
+
+def insert_expense_columns(columns, batch_size=1000):
+    """
+    Insert a column batch of expenses in a single transaction.
+
+    Same behaviour as insert_expenses_bulk, but takes one sequence per
+    column (lists, pandas Series or arrays) so columnar parsers never build
+    a dict per row.
+
+    Args:
+        columns (dict): INSERT_COLUMNS name -> sequence of values. A plain
+            string is used for every row (e.g. a single person).
+            OPTIONAL_INSERT_COLUMNS may be omitted.
+        batch_size (int): Number of rows sent to executemany at a time
+
+    Returns:
+        tuple: (rows inserted, rows skipped as duplicates)
+    """
+    return _insert_rows(_column_values(columns), batch_size)
+
+def insert_expense_chunks(chunks, batch_size=1000, progress=None):
+    """
+    Insert a stream of column batches in a single transaction.
+
+    ``chunks`` is consumed lazily, so a generator that parses the next
+    chunk of a file only runs once the previous chunk has been written.
+    Peak memory is one chunk, whatever the file size.
+
+    Args:
+        chunks (iterable): Column dictionaries as for insert_expense_columns
+        batch_size (int): Number of rows sent to executemany at a time
+        progress (callable): Called as progress(rows_seen, rows_inserted)
+            after every batch
+
+    Returns:
+        tuple: (rows inserted, rows skipped as duplicates)
+    """
+    values = (row for columns in chunks for row in _column_values(columns))
+    return _insert_rows(values, batch_size, progress)
+
+def insert_expense_chunk_groups(groups, batch_size=1000, progress=None):
+    """
+    Insert several streams of column batches in a single transaction.
+
+    Like insert_expense_chunks, but reports counts per stream, so a batch of
+    statement files is stored (or rolled back) together while each file
+    still gets its own inserted/duplicate counts.
+
+    Args:
+        groups (iterable): Iterables of column dictionaries, one per file
+        batch_size (int): Number of rows sent to executemany at a time
+        progress (callable): Called as progress(rows_seen, rows_inserted)
+            after every batch, counting across all groups
+
+    Returns:
+        list: (rows inserted, rows skipped as duplicates) per group
+    """
+    values = (
+        (row for columns in chunks for row in _column_values(columns))
+        for chunks in groups
+    )
+    return _insert_groups(values, batch_size, progress)
+
+def _column_values(columns):
+    """Iterate INSERT_COLUMNS tuples from a column dictionary."""
+    sequences = []
+    for name in INSERT_COLUMNS:
+        if name in OPTIONAL_INSERT_COLUMNS:
+            column = columns.get(name)
+        else:
+            column = columns[name]
+        if isinstance(column, str) or column is None:
+            column = repeat(column)
+        elif hasattr(column, 'tolist'):
+            column = column.tolist()  # numpy scalars -> Python values
+        sequences.append(column)
+    return zip(*sequences)
+
+def encode_cursor(date, expense_id):
+    """Encode a (date, id) keyset position as an opaque cursor string."""
+    raw = json.dumps([date, expense_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor() back into (date, id)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, expense_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(date, str) or not isinstance(expense_id, int):
+            raise ValueError
+        return date, expense_id
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _expense_filter_clause(start_date=None, end_date=None, **filters):
+    """Build a WHERE clause (without the keyword) and its parameters."""
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append('date >= ?')
+        params.append(start_date)
+    if end_date:
+        conditions.append('date <= ?')
+        params.append(end_date)
+    for column in EXPENSE_FILTERS:
+        value = filters.get(column)
+        if value is not None:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    return conditions, params
+
+def get_expenses_page(limit=100, cursor=None, fields=None, start_date=None,
+                      end_date=None, person=None, category=None, provider=None):
+    """
+    Get one page of expenses, newest first, using keyset pagination.
+
+    Pages are ordered by (date DESC, id DESC) and each page continues from
+    the cursor of the previous one, so every page costs an index seek plus
+    ``limit`` rows regardless of how deep into the table it is.
+
+    Args:
+        limit (int): Maximum number of rows to return
+        cursor (str): next_cursor from the previous page, or None to start
+        fields (list): Columns to return (default: all of EXPENSE_FIELDS)
+        start_date, end_date (str): Optional inclusive ISO date bounds
+        person, category, provider (str): Optional equality filters
+
+    Returns:
+        tuple: (list of expense dicts, next_cursor or None on the last page)
+    """
+    fields = list(fields or EXPENSE_FIELDS)
+    unknown = [field for field in fields if field not in EXPENSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+
+    conditions, params = _expense_filter_clause(
+        start_date, end_date, person=person, category=category, provider=provider
+    )
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        # Equivalent to (date, id) < (cursor_date, cursor_id), written so the
+        # date bound can seek the index
+        conditions.append('date <= ? AND (date < ? OR id < ?)')
+        params.extend([cursor_date, cursor_date, cursor_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    # date and id are always read so the next cursor can be built
+    columns = ', '.join(dict.fromkeys(['date', 'id', *fields]))
 
-def get_expenses_by_date_range(start_date, end_date):
-    """Get expenses within a date range."""
     conn = get_connection()
-    cursor = conn.cursor()
+    rows = conn.execute(f'''
+        SELECT {columns} FROM expenses
+        {where}
+        ORDER BY date DESC, id DESC
+        LIMIT ?
+    ''', (*params, limit + 1)).fetchall()
 
-    cursor.execute('''
-        SELECT * FROM expenses
-        WHERE date BETWEEN ? AND ?
-        ORDER BY date DESC
-    ''', (start_date, end_date))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['date'], rows[-1]['id'])
 
-    expenses = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return expenses
+    return [{field: row[field] for field in fields} for row in rows], next_cursor
+
+def iter_expenses(fields=None, batch_size=1000, start_date=None, end_date=None,
+                  person=None, category=None, provider=None):
+    """
+    Yield batches of expenses, newest first, without materializing the result.
+
+    Rows are pulled from SQLite with fetchmany, so memory stays bounded by
+    ``batch_size`` however many rows match.
+
+    Args:
+        fields (list): Columns to return (default: all of EXPENSE_FIELDS)
+        batch_size (int): Rows fetched per round trip
+        start_date, end_date (str): Optional inclusive ISO date bounds
+        person, category, provider (str): Optional equality filters
+
+    Yields:
+        list: Up to ``batch_size`` expense dicts
+    """
+    fields = list(fields or EXPENSE_FIELDS)
+    unknown = [field for field in fields if field not in EXPENSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    conditions, params = _expense_filter_clause(
+        start_date, end_date, person=person, category=category, provider=provider
+    )
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_connection()
+    cursor = conn.execute(f'''
+        SELECT {', '.join(fields)} FROM expenses
+        {where}
+        ORDER BY date DESC, id DESC
+    ''', params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+    finally:
+        cursor.close()
+
+def count_expenses(start_date=None, end_date=None, person=None, category=None,
+                   provider=None):
+    """Count expenses matching the listing filters (served by an index)."""
+    conditions, params = _expense_filter_clause(
+        start_date, end_date, person=person, category=category, provider=provider
+    )
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    conn = get_connection()
+    return conn.execute(f'SELECT COUNT(*) FROM expenses {where}', params).fetchone()[0]
+
+def get_expense_aggregates():
+    """
+    Aggregate expenses for the analytics and insights endpoints.
+
+    Reads the expense_rollup table, so the cost depends on the number of
+    (month, category, person, provider) groups rather than on the number of
+    expenses. Months are the 'YYYY-MM' prefix of the ISO date column.
+
+    Returns:
+        dict: Lists of sqlite3.Row keyed by grouping:
+            monthly           (month, credit, debit, count)
+            category_monthly  (month, category, credit, debit, count)
+            by_person         (person, credit, debit, count)
+            by_provider       (provider, credit, debit, count)
+            by_category       (category, credit, debit, count)
+        plus 'total_count', the number of expenses aggregated.
+    """
+    conn = get_connection()
+
+    def grouped(*columns):
+        positions = ', '.join(str(i + 1) for i in range(len(columns)))
+        return conn.execute(f'''
+            SELECT {', '.join(columns)}, TOTAL(credit) AS credit,
+                   TOTAL(debit) AS debit, TOTAL(count) AS count
+            FROM expense_rollup
+            GROUP BY {positions}
+            ORDER BY {positions}
+        ''').fetchall()
+
+    monthly = grouped('month')
+    return {
+        'monthly': monthly,
+        'category_monthly': grouped('month', 'category'),
+        'by_person': grouped('person'),
+        'by_provider': grouped('provider'),
+        'by_category': grouped('category'),
+        'total_count': int(sum(row['count'] for row in monthly))
+    }
+
+def rebuild_rollup():
+    """
+    Recompute expense_rollup from the expenses table.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('BEGIN')
+        for statement in REBUILD_ROLLUP_SQL:
+            conn.execute(statement)
+    return conn.execute('SELECT COUNT(*) FROM expense_rollup').fetchone()[0]
+
+def check_rollup_consistency(tolerance=0.005):
+    """
+    Compare expense_rollup against a fresh aggregate of the expenses table.
+
+    Args:
+        tolerance (float): Allowed absolute difference in credit/debit sums
+
+    Returns:
+        list: One dict per mismatched group (empty when consistent), with
+        the group key and the 'expected' and 'actual' (credit, debit, count)
+    """
+    conn = get_connection()
+    expected = {
+        tuple(row[:4]): tuple(row[4:])
+        for row in conn.execute(f'''
+            SELECT {ROLLUP_KEY.format(row='expenses')},
+                   TOTAL(credit), TOTAL(debit), COUNT(*)
+            FROM expenses
+            GROUP BY 1, 2, 3, 4
+        ''')
+    }
+    actual = {
+        tuple(row[:4]): tuple(row[4:])
+        for row in conn.execute('''
+            SELECT month, category, person, provider, credit, debit, count
+            FROM expense_rollup
+        ''')
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, (0.0, 0.0, 0))
+        got = actual.get(key, (0.0, 0.0, 0))
+        if (want[2] != got[2]
+                or abs(want[0] - got[0]) > tolerance
+                or abs(want[1] - got[1]) > tolerance):
+            mismatches.append({
+                'month': key[0],
+                'category': key[1],
+                'person': key[2],
+                'provider': key[3],
+                'expected': want,
+                'actual': got
+            })
+    return mismatches
+
+def delete_expense(expense_id):
+    """
+    Delete a single expense.
+
+    Returns:
+        bool: True if a row was deleted
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+    return cursor.rowcount > 0
 
 def delete_all_expenses():
     """Delete all expenses (for testing)."""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM expenses')
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute('BEGIN')
+        # Drop the per-row rollup trigger for the duration of the delete so
+        # SQLite can truncate the table instead of visiting every row
+        conn.execute('DROP TRIGGER IF EXISTS expenses_rollup_delete')
+        conn.execute('DELETE FROM expenses')
+        conn.execute('DELETE FROM expense_rollup')
+        conn.execute(ROLLUP_TRIGGERS['expenses_rollup_delete'])
+
+# Bound parameters per merchant_cache lookup (SQLite allows 999 by default)
+MERCHANT_LOOKUP_BATCH = 500
+
+def get_merchant_categories(merchants, rules_version):
+    """
+    Look up cached classifications of normalized merchants.
+
+    Args:
+        merchants (list): Normalized merchant keys
+        rules_version (str): Only entries made with these rules are returned
+
+    Returns:
+        dict: merchant -> (category, provider) for the keys found
+    """
+    conn = get_connection()
+    found = {}
+    merchants = list(merchants)
+    for start in range(0, len(merchants), MERCHANT_LOOKUP_BATCH):
+        batch = merchants[start:start + MERCHANT_LOOKUP_BATCH]
+        placeholders = ','.join('?' * len(batch))
+        rows = conn.execute(
+            f'''SELECT merchant, category, provider FROM merchant_cache
+                WHERE merchant IN ({placeholders}) AND rules_version = ?''',
+            (*batch, rules_version)
+        )
+        for merchant, category, provider in rows:
+            found[merchant] = (category, provider)
+    return found
+
+def put_merchant_categories(entries, rules_version):
+    """
+    Store classifications of normalized merchants.
+
+    When called inside an open transaction (e.g. while an upload is being
+    inserted), the rows join that transaction instead of committing it.
+
+    Args:
+        entries (iterable): (merchant, category, provider) tuples
+        rules_version (str): Rules version that produced them
+    """
+    conn = get_connection()
+    sql = '''INSERT OR REPLACE INTO merchant_cache
+             (merchant, category, provider, rules_version) VALUES (?, ?, ?, ?)'''
+    rows = [(*entry, rules_version) for entry in entries]
+    if conn.in_transaction:
+        conn.executemany(sql, rows)
+    else:
+        with conn:
+            conn.executemany(sql, rows)
+
+def clear_merchant_cache():
+    """Delete every cached merchant classification."""
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM merchant_cache')
+
+def confirm_expense_category(expense_id, category, merchant_key=None, rules_version=None):
+    """
+    Set an expense's category as confirmed by the user.
+
+    Confirmed categories are kept by re-categorization and used to train
+    the learned categorizer. Given ``merchant_key``, the merchant cache
+    entry of the expense's merchant is set to the category in the same
+    transaction, so later uploads of the merchant get it too.
+
+    Args:
+        expense_id (int): Expense to update
+        category (str): Confirmed category
+        merchant_key (callable): description -> merchant cache key
+        rules_version (str): Version to tag the merchant cache entry with
+
+    Returns:
+        tuple: The (merchant, category, provider) cache entry (merchant is
+        None without ``merchant_key``), or None if the expense does not exist
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            'SELECT description, provider FROM expenses WHERE id = ?', (expense_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            'UPDATE expenses SET category = ?, category_confirmed = 1 WHERE id = ?',
+            (category, expense_id)
+        )
+        merchant = None
+        provider = row['provider'] or 'Unknown'
+        if merchant_key is not None:
+            merchant = merchant_key(row['description'])
+            put_merchant_categories([(merchant, category, provider)], rules_version)
+    return merchant, category, provider
+
+def get_confirmed_categories():
+    """
+    Descriptions and categories of all user-confirmed expenses.
+
+    Returns:
+        tuple: (descriptions, categories) lists
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT description, category FROM expenses WHERE category_confirmed = 1 ORDER BY id'
+    ).fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+def count_stale_expenses(rules_version):
+    """Count unconfirmed expenses not yet categorized with ``rules_version``."""
+    conn = get_connection()
+    return conn.execute(
+        '''SELECT COUNT(*) FROM expenses
+           WHERE rules_version IS NOT ? AND category_confirmed = 0''',
+        (rules_version,)
+    ).fetchone()[0]
+
+def get_stale_expenses(rules_version, after_id=0, limit=1000):
+    """
+    Next batch of unconfirmed expenses not yet categorized with ``rules_version``.
+
+    Keyset-paginated on id: pass the last id of the previous batch as
+    ``after_id``.
+
+    Returns:
+        list: sqlite3.Row objects with id and description, by ascending id
+    """
+    conn = get_connection()
+    return conn.execute(
+        '''SELECT id, description FROM expenses
+           WHERE id > ? AND rules_version IS NOT ? AND category_confirmed = 0
+           ORDER BY id LIMIT ?''',
+        (after_id, rules_version, limit)
+    ).fetchall()
+
+def update_expense_categories(rows, rules_version, after_id, last_id):
+    """
+    Write re-computed categories for one batch of stale expenses.
+
+    Only rows whose category or provider actually changed are rewritten
+    (and so touch the rollup); every stale unconfirmed row in
+    (after_id, last_id] is then stamped with ``rules_version``. One short transaction per batch, so
+    dashboard reads and uploads are never held up for long.
+
+    Args:
+        rows (list): (id, category, provider) tuples
+        rules_version (str): Version the categories were computed with
+        after_id (int): Exclusive lower id bound of the batch
+        last_id (int): Inclusive upper id bound of the batch
+
+    Returns:
+        int: Number of rows whose category or provider changed
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany(
+            '''UPDATE expenses SET category = ?, provider = ?
+               WHERE id = ? AND category_confirmed = 0
+                 AND (category IS NOT ? OR provider IS NOT ?)''',
+            [(category, provider, expense_id, category, provider)
+             for expense_id, category, provider in rows]
+        )
+        changed = cursor.rowcount
+        conn.execute(
+            '''UPDATE expenses SET rules_version = ?
+               WHERE id > ? AND id <= ? AND rules_version IS NOT ?
+                 AND category_confirmed = 0''',
+            (rules_version, after_id, last_id, rules_version)
+        )
+    return changed
+
+def _job_dict(row):
+    """Job row as a dictionary, with params/result decoded from JSON."""
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    if job['result'] is not None:
+        job['result'] = json.loads(job['result'])
+    return job
+
+def create_job(kind, params):
+    """
+    Record a queued job.
+
+    Args:
+        kind (str): Job type (e.g. 'upload')
+        params (dict): JSON-serializable arguments for the job
+
+    Returns:
+        int: The new job id
+    """
+    conn = get_jobs_connection()
+    with conn:
+        cursor = conn.execute(
+            'INSERT INTO jobs (kind, params, created_at) VALUES (?, ?, ?)',
+            (kind, json.dumps(params), datetime.now().timestamp())
+        )
+    return cursor.lastrowid
+
+def get_job(job_id):
+    """Get a job by id, or None if it does not exist."""
+    conn = get_jobs_connection()
+    row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_dict(row) if row else None
+
+def claim_job(job_id, owner, lease_seconds):
+    """
+    Mark a queued job as running in ``owner``'s process.
+
+    The check and the update are one statement, so of several callers
+    racing for the same job exactly one claims it. The claim lasts
+    ``lease_seconds`` unless renewed with renew_job_leases().
+
+    Returns:
+        dict: The claimed job, or None if it is not queued (already claimed,
+        finished or missing)
+    """
+    now = datetime.now().timestamp()
+    conn = get_jobs_connection()
+    with conn:
+        cursor = conn.execute(
+            '''UPDATE jobs SET status = 'running', started_at = ?, owner = ?,
+                   lease_expires_at = ?
+               WHERE status = 'queued' AND id = ?''',
+            (now, owner, now + lease_seconds, job_id)
+        )
+        if cursor.rowcount == 0:
+            return None
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_dict(row)
+
+def renew_job_leases(job_ids, owner, lease_seconds):
+    """Extend ``owner``'s lease on the given running jobs."""
+    if not job_ids:
+        return
+    conn = get_jobs_connection()
+    placeholders = ','.join('?' * len(job_ids))
+    with conn:
+        conn.execute(
+            f'''UPDATE jobs SET lease_expires_at = ?
+                WHERE id IN ({placeholders}) AND status = 'running' AND owner = ?''',
+            (datetime.now().timestamp() + lease_seconds, *job_ids, owner)
+        )
+
+def finish_job(job_id, owner, rows_processed, result=None, error=None):
+    """
+    Mark a job as done, or as failed if ``error`` is given.
+
+    Only a job ``owner`` is running is updated: a job whose lease expired
+    and was queued again no longer belongs to it.
+
+    Args:
+        job_id (int): Job id
+        owner (str): Process that claimed the job, or None to fail a job
+            that could not be claimed (updated only while still queued)
+        rows_processed (int): Rows the job worked through
+        result (dict): JSON-serializable job result
+        error (str): Error message for a failed job
+
+    Returns:
+        bool: True if the job was updated
+    """
+    conn = get_jobs_connection()
+    with conn:
+        cursor = conn.execute(
+            '''UPDATE jobs SET status = ?, rows_processed = ?, result = ?,
+                   error = ?, finished_at = ?, lease_expires_at = NULL
+               WHERE id = ? AND status = ? AND owner IS ?''',
+            (
+                'failed' if error else 'done',
+                rows_processed,
+                None if result is None else json.dumps(result),
+                error,
+                datetime.now().timestamp(),
+                job_id,
+                'queued' if owner is None else 'running',
+                owner
+            )
+        )
+    return cursor.rowcount > 0
+
+def requeue_jobs():
+    """
+    Put running jobs whose lease expired (their process died) back in the
+    queue. Jobs of live processes, which keep renewing their leases, are
+    left alone.
+
+    Returns:
+        list: Every queued job, oldest first
+    """
+    conn = get_jobs_connection()
+    with conn:
+        conn.execute(
+            '''UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL,
+                   lease_expires_at = NULL
+               WHERE status = 'running'
+                 AND (lease_expires_at IS NULL OR lease_expires_at < ?)''',
+            (datetime.now().timestamp(),)
+        )
+    rows = conn.execute(
+        "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id"
+    ).fetchall()
+    return [_job_dict(row) for row in rows]
 
 # Initialize database on import
 init_db()
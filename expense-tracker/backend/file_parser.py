@@ -1,8 +1,96 @@
 import pandas as pd
 import PyPDF2
+import openpyxl
 import re
-from datetime import datetime
+import calendar
+from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+import hashlib
 import io
+import multiprocessing
+import os
+import threading
+
+import parse_cache
+from bank_profiles import (
+    find_profile, registry_version, SIGN_SPLIT, SIGN_NEGATIVE_DEBIT
+)
+
+# Bump whenever parsing output changes, so cached parse results are not reused
+PARSER_VERSION = 3
+
+# Largest streamed upload (in rows) whose parse is kept in the parse cache;
+# its rows are held in memory until the last chunk has been read
+CACHE_MAX_STREAMED_ROWS = 200000
+
+# Common date formats, in the order they are tried
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%m-%d-%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+    '%d %b %Y',
+    '%d %B %Y',
+    '%b %d, %Y',
+    '%B %d, %Y',
+    '%m/%d/%y',
+    '%d/%m/%y'
+]
+
+# Header keywords for each statement column, most specific first. A name
+# equal to a keyword beats one that merely contains it.
+DATE_KEYWORDS = [
+    'transaction date', 'trans date', 'date', 'posted date', 'posting date', 'post date'
+]
+DESCRIPTION_KEYWORDS = ['description', 'narration', 'merchant', 'vendor', 'payee', 'detail']
+CREDIT_KEYWORDS = ['credit', 'deposit', 'paid in', 'payment']
+DEBIT_KEYWORDS = ['debit', 'withdrawal', 'charge', 'purchase', 'paid out', 'amount']
+
+# Distinct values sampled when inferring a column's date format
+DATE_SAMPLE_SIZE = 200
+
+# Output columns of the vectorized (columnar) parsers
+FRAME_COLUMNS = ['date', 'description', 'credit', 'debit']
+
+# Rows per chunk when streaming large CSV files
+CSV_CHUNK_SIZE = 50000
+
+# Leading rows of each worksheet searched for the header row
+XLSX_HEADER_SCAN_ROWS = 30
+
+# PDF text extraction: statements with at least PDF_PARALLEL_MIN_PAGES pages
+# are split into one page range per process, across PDF_WORKERS processes
+PDF_WORKERS = os.cpu_count() or 1
+PDF_PARALLEL_MIN_PAGES = 8
+
+_pdf_executor_lock = threading.Lock()
+_pdf_executor = None
+
+# Leading characters of a statement searched for its year
+YEAR_CONTEXT_CHARS = 1000
+
+# One statement transaction line: a numeric date or an Amex-style "Month DD",
+# then the description, then the amount at the end of the line. The greedy
+# description only backtracks from the end of the line; it cannot end in
+# whitespace or a currency symbol, and the amount must start a digit run,
+# so the amount is the whole trailing number (as with a left-to-right search).
+STATEMENT_LINE = re.compile(r"""
+    (?:
+        (?P<numeric_date>\d{1,2}[/-]\d{1,2}[/-]\d{2,4})(?!\d)
+      | (?P<month>[A-Za-z]{3,})\s+(?P<day>\d{1,2})(?=\s)
+    )
+    \s*(?P<description>(?:.*[^\s$£€¥])?)
+    \s*[$£€¥]?\s*(?<![\d,])(?P<amount>[\d,]+\.\d{2})\s*$
+""", re.VERBOSE)
+
+# Full month names (as accepted by strptime's %B) -> month number
+MONTH_NUMBERS = {
+    name.lower(): number for number, name in enumerate(calendar.month_name) if name
+}
 
 def parse_date(date_str):
     """
@@ -11,33 +99,83 @@ def parse_date(date_str):
     if pd.isna(date_str):
         return datetime.now().strftime('%Y-%m-%d')
 
-    date_str = str(date_str).strip()
-
-    # Common date formats
-    date_formats = [
-        '%Y-%m-%d',
-        '%m/%d/%Y',
-        '%d/%m/%Y',
-        '%m-%d-%Y',
-        '%d-%m-%Y',
-        '%Y/%m/%d',
-        '%d %b %Y',
-        '%d %B %Y',
-        '%b %d, %Y',
-        '%B %d, %Y',
-        '%m/%d/%y',
-        '%d/%m/%y'
-    ]
-
-    for fmt in date_formats:
+    # Spreadsheets hand us real dates already
+    if isinstance(date_str, (datetime, date)):
+        return date_str.strftime('%Y-%m-%d')
+
+    parsed = _parse_date_text(str(date_str).strip())
+    if parsed:
+        return parsed
+
+    # If all else fails, return current date
+    return datetime.now().strftime('%Y-%m-%d')
+
+@lru_cache(maxsize=8192)
+def _parse_date_text(date_str):
+    """
+    Parse a date string with the first matching DATE_FORMATS entry.
+
+    Memoized: statements repeat the same date strings many times.
+
+    Returns:
+        str: ISO date, or None if no format matches
+    """
+    for fmt in DATE_FORMATS:
         try:
-            parsed_date = datetime.strptime(date_str, fmt)
-            return parsed_date.strftime('%Y-%m-%d')
+            return datetime.strptime(date_str, fmt).strftime('%Y-%m-%d')
         except ValueError:
             continue
+    return None
 
-    # If all else fails, return current date
-    return datetime.now().strftime('%Y-%m-%d')
+def infer_date_format(values, sample_size=DATE_SAMPLE_SIZE):
+    """
+    Pick the one date format that fits a column, from a sample of it.
+
+    Args:
+        values (iterable): Date strings from one column
+        sample_size (int): Distinct values to test
+
+    Returns:
+        tuple: (format or None, ambiguous). The format is the first entry in
+        DATE_FORMATS that parses the most sampled values. ``ambiguous`` is
+        True when another format parses them equally well but to different
+        dates, e.g. '03/04/2024' under both MM/DD and DD/MM.
+    """
+    sample = []
+    seen = set()
+    for value in values:
+        if pd.isna(value):
+            continue
+        value = str(value).strip()
+        if value and value not in seen:
+            seen.add(value)
+            sample.append(value)
+            if len(sample) >= sample_size:
+                break
+    if not sample:
+        return None, False
+
+    results = {}
+    for fmt in DATE_FORMATS:
+        parsed = []
+        for value in sample:
+            try:
+                parsed.append(datetime.strptime(value, fmt))
+            except ValueError:
+                parsed.append(None)
+        hits = sum(p is not None for p in parsed)
+        if hits:
+            results[fmt] = (hits, parsed)
+    if not results:
+        return None, False
+
+    best_hits = max(hits for hits, _ in results.values())
+    candidates = [fmt for fmt, (hits, _) in results.items() if hits == best_hits]
+    chosen = candidates[0]
+    ambiguous = any(
+        results[fmt][1] != results[chosen][1] for fmt in candidates[1:]
+    )
+    return chosen, ambiguous
 
 def clean_amount(amount_str):
     """
@@ -58,9 +196,268 @@ def clean_amount(amount_str):
     except ValueError:
         return 0.0
 
-def parse_csv(file_content):
+def normalize_columns(columns):
+    """Lowercase header names and collapse their whitespace."""
+    return [' '.join(str(column).lower().split()) for column in columns]
+
+def _pick_column(columns, keywords, taken):
+    """First column equal to a keyword, else first containing one (in keyword order)."""
+    candidates = [col for col in columns if col not in taken]
+    for keyword in keywords:
+        if keyword in candidates:
+            return keyword
+    for keyword in keywords:
+        for col in candidates:
+            if keyword in col:
+                return col
+    return None
+
+def find_columns(columns):
     """
-    Parse CSV file and extract expense data.
+    Find the date, description, credit and debit columns by name.
+
+    Any column with "date" in its name is a date column and is never taken
+    as a description or amount (so "payment date" is not the credit
+    column); the date column itself is the best match for DATE_KEYWORDS.
+
+    Args:
+        columns (iterable): Normalized column names (see normalize_columns)
+
+    Returns:
+        tuple: (date_col, desc_col, credit_col, debit_col); None where missing
+    """
+    columns = list(columns)
+    taken = {col for col in columns if 'date' in col}
+
+    date_col = _pick_column(columns, DATE_KEYWORDS, set())
+    desc_col = _pick_column(columns, DESCRIPTION_KEYWORDS, taken)
+    taken.add(desc_col)
+    credit_col = _pick_column(columns, CREDIT_KEYWORDS, taken)
+    taken.add(credit_col)
+    debit_col = _pick_column(columns, DEBIT_KEYWORDS, taken)
+
+    return date_col, desc_col, credit_col, debit_col
+
+def resolve_profile(columns):
+    """
+    Statement format of a header row.
+
+    Known formats come straight from the bank_profiles registry; anything
+    else falls back to find_columns(), with amounts taken as they are.
+
+    Args:
+        columns (iterable): Normalized column names (see normalize_columns)
+
+    Returns:
+        dict: Profile (name is None for a detected format), or None if no
+        date or description column can be found
+    """
+    profile = find_profile(columns)
+    if profile is not None:
+        return profile
+
+    date_col, desc_col, credit_col, debit_col = find_columns(columns)
+    if not date_col or not desc_col:
+        return None
+    return {
+        'name': None,
+        'date': date_col,
+        'description': desc_col,
+        'credit': credit_col,
+        'debit': debit_col,
+        'date_format': None,
+        'sign': SIGN_SPLIT
+    }
+
+def parse_date_column(values, date_format=None):
+    """
+    Vectorized parse_date() over a whole column.
+
+    The column's format is inferred once from a sample (or given), and the
+    distinct values are parsed with that single format. Values it does not
+    fit fall back to the memoized per-value parse_date() lookup.
+
+    Args:
+        values (iterable): Raw date values from one column
+        date_format (str): Known format (e.g. from an earlier chunk of the
+            same file); inferred when None
+
+    Returns:
+        tuple: (pd.Series of ISO 'YYYY-MM-DD' strings aligned with
+        ``values``, dict with the 'format' used, whether it was 'ambiguous',
+        and how many values were 'unparsed' and defaulted to today)
+    """
+    values = pd.Series(values)
+    today = datetime.now().strftime('%Y-%m-%d')
+    info = {'format': date_format, 'ambiguous': False, 'unparsed': 0}
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        info['unparsed'] = int(values.isna().sum())
+        return values.dt.strftime('%Y-%m-%d').fillna(today), info
+
+    unique = pd.Series(values.dropna().unique())
+    if unique.empty:
+        info['unparsed'] = len(values)
+        return pd.Series(today, index=values.index), info
+
+    # Real dates (e.g. from Excel) in an object column
+    is_date = unique.map(lambda v: isinstance(v, (datetime, date)))
+    parsed = pd.Series(pd.NaT, index=unique.index, dtype='datetime64[ns]')
+    if is_date.any():
+        parsed[is_date] = pd.to_datetime(unique[is_date], errors='coerce')
+
+    text = unique.astype(str).str.strip()
+    if date_format is None:
+        info['format'], info['ambiguous'] = infer_date_format(text[~is_date])
+
+    if info['format']:
+        pending = ~is_date
+        parsed[pending] = pd.to_datetime(text[pending], format=info['format'], errors='coerce')
+
+    iso = parsed.dt.strftime('%Y-%m-%d').copy()
+    leftover = iso.isna() & ~is_date
+    if leftover.any():
+        iso[leftover] = text[leftover].map(_parse_date_text)
+
+    lookup = dict(zip(unique, iso))
+    dates = values.map(lookup)
+    info['unparsed'] = int(dates.isna().sum())
+    return dates.fillna(today), info
+
+def clean_amount_column(values):
+    """
+    Vectorized clean_amount() over a whole column.
+
+    Returns:
+        pd.Series: float amounts, 0.0 where the value is empty or invalid
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float).fillna(0.0)
+
+    text = (
+        values.astype(str).str.strip()
+        .str.replace(r'[$,£€¥]', '', regex=True)
+        .str.replace('(', '-', regex=False)
+        .str.replace(')', '', regex=False)
+    )
+    text = text.where(values.notna(), '')
+    return pd.to_numeric(text, errors='coerce').fillna(0.0)
+
+def convert_frame(df, date_col, desc_col, credit_col=None, debit_col=None,
+                  date_format=None, amount_col=None, sign=SIGN_SPLIT):
+    """
+    Convert a raw statement DataFrame to the standard expense columns.
+
+    Column-at-a-time equivalent of converting each row with parse_date and
+    clean_amount. Rows with no description are dropped. With ``amount_col``
+    a single signed amount column is split into credit and debit according
+    to ``sign`` (see bank_profiles).
+
+    Returns:
+        pd.DataFrame: Columns FRAME_COLUMNS (date, description, credit, debit),
+        with the parse_date_column() info in ``frame.attrs['dates']``
+    """
+    description = df[desc_col].astype(str).str.strip()
+    keep = df[desc_col].notna() & (description != '') & (description != 'nan')
+    dates, date_info = parse_date_column(df[date_col], date_format)
+
+    if amount_col:
+        amount = clean_amount_column(df[amount_col])
+        if sign == SIGN_NEGATIVE_DEBIT:
+            amount = -amount
+        credit = (-amount).clip(lower=0.0)
+        debit = amount.clip(lower=0.0)
+    else:
+        credit = clean_amount_column(df[credit_col]) if credit_col else 0.0
+        debit = clean_amount_column(df[debit_col]) if debit_col else 0.0
+
+    frame = pd.DataFrame({
+        'date': dates,
+        'description': description,
+        'credit': credit,
+        'debit': debit
+    }, index=df.index, columns=FRAME_COLUMNS)
+
+    frame = frame[keep].reset_index(drop=True)
+    frame.attrs['dates'] = date_info
+    return frame
+
+def convert_rows(df, date_col, desc_col, credit_col=None, debit_col=None):
+    """
+    Row-by-row conversion; fallback for frames convert_frame() rejects.
+
+    Returns:
+        pd.DataFrame: Columns FRAME_COLUMNS (date, description, credit, debit)
+    """
+    expenses = []
+    for _, row in df.iterrows():
+        expense = {
+            'date': parse_date(row[date_col]),
+            'description': str(row[desc_col]).strip(),
+            'credit': clean_amount(row[credit_col]) if credit_col else 0.0,
+            'debit': clean_amount(row[debit_col]) if debit_col else 0.0
+        }
+
+        # Skip rows with no description
+        if expense['description'] and expense['description'] != 'nan':
+            expenses.append(expense)
+
+    return pd.DataFrame(expenses, columns=FRAME_COLUMNS)
+
+def convert_profile(df, profile, date_format=None):
+    """
+    Convert a raw statement DataFrame using a format profile.
+
+    Args:
+        df (pd.DataFrame): Raw table with normalized column names
+        profile (dict): From resolve_profile()
+        date_format (str): Known date format (e.g. from an earlier chunk);
+            defaults to the profile's
+
+    Returns:
+        pd.DataFrame: Columns FRAME_COLUMNS, with the parse_date_column()
+        info in ``frame.attrs['dates']`` and the profile name in
+        ``frame.attrs['profile']``
+    """
+    columns = (profile['date'], profile['description'], profile.get('credit'), profile.get('debit'))
+    date_format = date_format or profile.get('date_format')
+    if profile.get('amount'):
+        frame = convert_frame(df, *columns, date_format=date_format,
+                              amount_col=profile['amount'], sign=profile['sign'])
+    else:
+        try:
+            frame = convert_frame(df, *columns, date_format=date_format)
+        except (TypeError, ValueError, AttributeError):
+            frame = convert_rows(df, *columns)
+    frame.attrs['profile'] = profile['name']
+    return frame
+
+def statement_frame(df, source='file'):
+    """
+    Detect the statement format of a raw DataFrame and convert it.
+
+    Args:
+        df (pd.DataFrame): Raw table as read from the file
+        source (str): File kind, for error messages
+
+    Returns:
+        pd.DataFrame: Columns FRAME_COLUMNS (date, description, credit, debit)
+    """
+    df.columns = normalize_columns(df.columns)
+
+    profile = resolve_profile(df.columns)
+    if profile is None:
+        raise ValueError(f"Could not find date or description columns in {source}")
+    return convert_profile(df, profile)
+
+def frame_to_expenses(frame):
+    """Convert a FRAME_COLUMNS DataFrame to a list of expense dictionaries."""
+    return frame.to_dict('records')
+
+def parse_csv_frame(file_content):
+    """
+    Parse a CSV file into a FRAME_COLUMNS DataFrame.
 
     Expected columns (flexible):
     - Date (date, transaction date, trans date, etc.)
@@ -69,139 +466,218 @@ def parse_csv(file_content):
     - Debit (debit, charge, amount, purchase, etc.)
     """
     try:
-        # Read CSV
         df = pd.read_csv(io.StringIO(file_content.decode('utf-8')))
+        return statement_frame(df, 'CSV')
 
-        # Convert column names to lowercase for easier matching
-        df.columns = df.columns.str.lower().str.strip()
-
-        # Find relevant columns
-        date_col = None
-        desc_col = None
-        credit_col = None
-        debit_col = None
+    except Exception as e:
+        raise ValueError(f"Error parsing CSV: {str(e)}")
 
-        for col in df.columns:
-            if not date_col and any(x in col for x in ['date', 'trans date', 'transaction date', 'posted date']):
-                date_col = col
-            elif not desc_col and any(x in col for x in ['description', 'merchant', 'vendor', 'detail']):
-                desc_col = col
-            elif not credit_col and any(x in col for x in ['credit', 'payment', 'deposit']):
-                credit_col = col
-            elif not debit_col and any(x in col for x in ['debit', 'charge', 'amount', 'purchase', 'withdrawal']):
-                debit_col = col
+def iter_csv_frames(path, chunksize=CSV_CHUNK_SIZE):
+    """
+    Stream a CSV file from disk as a sequence of FRAME_COLUMNS DataFrames.
 
-        if not date_col or not desc_col:
-            raise ValueError("Could not find date or description columns in CSV")
+    The format profile and date format are resolved on the first chunk and
+    reused for the rest, so memory is bounded by ``chunksize`` rather than
+    by the file size.
 
-        expenses = []
-        for _, row in df.iterrows():
-            expense = {
-                'date': parse_date(row[date_col]),
-                'description': str(row[desc_col]).strip(),
-                'credit': clean_amount(row[credit_col]) if credit_col else 0.0,
-                'debit': clean_amount(row[debit_col]) if debit_col else 0.0
-            }
-
-            # Skip rows with no description
-            if expense['description'] and expense['description'] != 'nan':
-                expenses.append(expense)
+    Args:
+        path (str): Path of the CSV file
+        chunksize (int): Rows per chunk
 
-        return expenses
+    Yields:
+        pd.DataFrame: Columns FRAME_COLUMNS, with parse_date_column() info
+        for the chunk in ``frame.attrs['dates']``
+    """
+    try:
+        profile = None
+        date_format = None
+        for chunk in pd.read_csv(path, chunksize=chunksize, encoding='utf-8'):
+            chunk.columns = normalize_columns(chunk.columns)
+            if profile is None:
+                profile = resolve_profile(chunk.columns)
+                if profile is None:
+                    raise ValueError("Could not find date or description columns in CSV")
+
+            frame = convert_profile(chunk, profile, date_format)
+            info = frame.attrs.get('dates')
+            if date_format is None and info:
+                date_format = info['format']
+            yield frame
 
     except Exception as e:
         raise ValueError(f"Error parsing CSV: {str(e)}")
 
-def parse_pdf(file_content):
+def merge_date_info(infos):
+    """Combine the per-chunk (or per-sheet) date info of one file into one summary."""
+    merged = None
+    for info in infos:
+        if not info:
+            continue
+        if merged is None:
+            merged = dict(info)
+        else:
+            merged['format'] = merged['format'] or info['format']
+            merged['ambiguous'] = merged['ambiguous'] or info['ambiguous']
+            merged['unparsed'] += info['unparsed']
+    return merged
+
+def parse_csv(file_content):
     """
-    Parse PDF file and extract expense data.
-    Supports standard numeric dates and Amex-style "Month DD" dates.
+    Parse CSV file and extract expense data.
+
+    Returns:
+        list: List of expense dictionaries
     """
-    try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = ""
+    return frame_to_expenses(parse_csv_frame(file_content))
+
+def _extract_page_range(file_content, start, stop):
+    """Extract the text of pages [start, stop) of a PDF (process pool worker)."""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    return [pdf_reader.pages[i].extract_text() for i in range(start, stop)]
+
+def get_pdf_executor():
+    """
+    Shared process pool for PDF text extraction, started on first use.
+
+    Workers are spawned rather than forked: forking a multithreaded server
+    process can leave the children holding locks no thread will release.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pdf_executor
+
+def shutdown_pdf_executor(wait=True):
+    """Stop the shared PDF pool; the next get_pdf_executor() starts a new one."""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        executor, _pdf_executor = _pdf_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+def _page_ranges(page_count, parts):
+    """Split pages into at most ``parts`` contiguous ranges of near-equal size."""
+    parts = max(1, min(parts, page_count))
+    bounds = [page_count * i // parts for i in range(parts + 1)]
+    return bounds[:-1], bounds[1:]
+
+def iter_pdf_page_texts(file_content, workers=None, executor=None):
+    """
+    Yield the text of each page of a PDF, in page order.
 
+    PyPDF2 extraction is CPU-bound, so statements with at least
+    PDF_PARALLEL_MIN_PAGES pages are split into one contiguous page range
+    per worker and extracted across a process pool; each worker receives
+    and parses the PDF once. Pages are yielded as soon as their range is
+    done, so callers can start parsing the first pages while later ones are
+    still being extracted.
+
+    Args:
+        file_content (bytes): PDF content
+        workers (int): Page ranges to split into, one per worker process
+            (default PDF_WORKERS; 1 = serial, in the calling thread)
+        executor (ProcessPoolExecutor): Long-lived pool to extract with,
+            whatever the page count (e.g. the job runner's); by default the
+            shared get_pdf_executor() pool
+    """
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    page_count = len(pdf_reader.pages)
+    workers = workers or PDF_WORKERS
+
+    if workers <= 1 or (executor is None and page_count < PDF_PARALLEL_MIN_PAGES):
         for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+            yield page.extract_text()
+        return
+
+    executor = executor or get_pdf_executor()
+    starts, stops = _page_ranges(page_count, workers)
+    # map() returns results in submission order
+    for texts in executor.map(_extract_page_range, repeat(file_content), starts, stops):
+        yield from texts
 
+def _parse_statement_text(text, year_ctx):
+    """
+    Extract expenses from the transaction lines of a block of statement text.
+
+    Each line is scanned once with STATEMENT_LINE, which pulls out the date,
+    description and trailing amount together.
+
+    Args:
+        text (str): Text of one or more pages
+        year_ctx (int): Year for "Month DD" dates that carry no year
+
+    Returns:
+        list: List of expense dictionaries
+    """
+    expenses = []
+    match_line = STATEMENT_LINE.match
+    for line in text.split('\n'):
+        match = match_line(line.strip())
+        if not match:
+            continue
+
+        description = match.group('description')
+        if not description:
+            continue
+
+        numeric_date = match.group('numeric_date')
+        if numeric_date:
+            # 1. Standard numeric date (DD/MM/YYYY or similar)
+            processed_date = parse_date(numeric_date)
+        else:
+            # 2. Amex-style "Month DD" (e.g. "September 17") in the statement year
+            month = MONTH_NUMBERS.get(match.group('month').lower())
+            if not month:
+                continue
+            try:
+                processed_date = date(year_ctx, month, int(match.group('day'))).isoformat()
+            except ValueError:
+                # Not a valid date, skip
+                continue
+
+        expenses.append({
+            'date': processed_date,
+            'description': description,
+            'credit': 0.0,
+            'debit': float(match.group('amount').replace(',', ''))
+        })
+
+    return expenses
+
+def parse_pdf(file_content, workers=None, executor=None):
+    """
+    Parse PDF file and extract expense data.
+    Supports standard numeric dates and Amex-style "Month DD" dates.
+
+    Pages are extracted in parallel (see iter_pdf_page_texts) and parsed as
+    they arrive.
+    """
+    try:
         expenses = []
-        
-        # specific year finding logic
-        # Look for "Statement Period" or just "202X" in the first chunk of text to guess the year
-        # This is important for "Month DD" formats that don't have the year
-        year_ctx = datetime.now().year
-        year_match = re.search(r'\b20[2-3]\d\b', text[:1000]) # Look in first 1000 chars
-        if year_match:
-            year_ctx = int(year_match.group(0))
-
-        lines = text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line:
+        # Pages held back until the statement year is known
+        pending = []
+        pending_chars = 0
+        year_ctx = None
+
+        for page_text in iter_pdf_page_texts(file_content, workers, executor):
+            page_text += "\n"
+            if year_ctx is not None:
+                expenses.extend(_parse_statement_text(page_text, year_ctx))
                 continue
 
-            # 1. Try standard numeric date pattern (DD/MM/YYYY or similar)
-            date_match_numeric = re.match(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', line)
-            
-            # 2. Try Month Name DD pattern (e.g. "September 17")
-            # Matches: Start of line, Month name (3+ chars), space, 1-2 digits, space...
-            date_match_text = re.match(r'([A-Za-z]{3,}\s+\d{1,2})\s+', line)
-
-            if date_match_numeric:
-                date_str = date_match_numeric.group(1)
-                remaining = line[len(date_str):].strip()
-                processed_date = parse_date(date_str)
-                
-                # Extract amount and description
-                amount_match = re.search(r'[\$£€¥]?\s*([\d,]+\.\d{2})\s*$', remaining)
-                if amount_match:
-                    amount_str = amount_match.group(1)
-                    description = remaining[:remaining.rfind(amount_str)].strip()
-                    if description:
-                        expenses.append({
-                            'date': processed_date,
-                            'description': description,
-                            'credit': 0.0,
-                            'debit': clean_amount(amount_str)
-                        })
-
-            elif date_match_text:
-                raw_date_part = date_match_text.group(1) # e.g. "September 17"
-                # Construct a full date string with the found year
-                date_str_with_year = f"{raw_date_part} {year_ctx}"
-                
-                remaining = line[len(raw_date_part):].strip()
-                
-                # Extract amount and description (same logic)
-                amount_match = re.search(r'[\$£€¥]?\s*([\d,]+\.\d{2})\s*$', remaining)
-                
-                # For Amex, sometimes there are extra columns or codes before the amount
-                # The line format is usually: Date Description content... Amount
-                
-                if amount_match:
-                    amount_str = amount_match.group(1)
-                    # Amount match finds the LAST amount at the end of the line
-                    
-                    description = remaining[:remaining.rfind(amount_str)].strip()
-                    
-                    # Clean up description (sometimes has extra location data or codes at the end)
-                    # For now, keep it simple.
-                    
-                    if description:
-                         # Attempt to parse the date
-                        try:
-                            parsed_date_obj = datetime.strptime(date_str_with_year, '%B %d %Y')
-                            processed_date = parsed_date_obj.strftime('%Y-%m-%d')
-                            
-                            expenses.append({
-                                'date': processed_date,
-                                'description': description,
-                                'credit': 0.0,
-                                'debit': clean_amount(amount_str)
-                            })
-                        except ValueError:
-                            # Not a valid date format, skip
-                            continue
+            pending.append(page_text)
+            pending_chars += len(page_text)
+            if pending_chars >= YEAR_CONTEXT_CHARS:
+                year_ctx = _statement_year(''.join(pending))
+                expenses.extend(_parse_statement_text(''.join(pending), year_ctx))
+                pending = []
+
+        if pending:
+            year_ctx = _statement_year(''.join(pending))
+            expenses.extend(_parse_statement_text(''.join(pending), year_ctx))
 
         if not expenses:
             raise ValueError("Could not extract expense data from PDF. The format may not be supported.")
@@ -211,54 +687,186 @@ def parse_pdf(file_content):
     except Exception as e:
         raise ValueError(f"Error parsing PDF: {str(e)}")
 
-def parse_xlsx(file_content):
+def _statement_year(text):
     """
-    Parse XLSX/Excel file and extract expense data.
+    Guess the statement year for "Month DD" dates that carry no year.
+
+    Looks for "202X" in the first YEAR_CONTEXT_CHARS characters, which
+    covers the statement period in the header.
+    """
+    year_match = re.search(r'\b20[2-3]\d\b', text[:YEAR_CONTEXT_CHARS])
+    if year_match:
+        return int(year_match.group(0))
+    return datetime.now().year
+
+def _sheet_header(row):
+    """
+    Column names for a worksheet header row.
+
+    Cells are normalized like statement_frame() does; blank and repeated
+    names get pandas-style "unnamed: N" / "name.N" names.
+    """
+    names = []
+    seen = {}
+    for i, cell in enumerate(row):
+        name = normalize_columns([cell])[0] if cell is not None else ''
+        name = name or f'unnamed: {i}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _iter_sheet_frames(worksheet, chunksize):
+    """
+    Stream one worksheet as FRAME_COLUMNS DataFrames.
+
+    The header is the first of the leading XLSX_HEADER_SCAN_ROWS rows that
+    resolves to a format profile; the date format is inferred on the first
+    chunk. Sheets without such a header (e.g. summaries) yield nothing.
+    """
+    rows = worksheet.iter_rows(values_only=True)
+
+    header = None
+    for _, row in zip(range(XLSX_HEADER_SCAN_ROWS), rows):
+        names = _sheet_header(row)
+        profile = resolve_profile(names)
+        if profile is not None:
+            header = names
+            break
+    if header is None:
+        return
+
+    date_format = None
+    width = len(header)
+
+    def to_frame(batch):
+        nonlocal date_format
+        chunk = pd.DataFrame(batch, columns=header)
+        frame = convert_profile(chunk, profile, date_format)
+        info = frame.attrs.get('dates')
+        if date_format is None and info:
+            date_format = info['format']
+        frame.attrs['sheet'] = worksheet.title
+        return frame
+
+    batch = []
+    for row in rows:
+        if all(cell is None for cell in row):
+            continue
+        # Rows can be ragged in read-only mode; fit them to the header
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        batch.append(row)
+        if len(batch) >= chunksize:
+            yield to_frame(batch)
+            batch = []
+    if batch:
+        yield to_frame(batch)
+
+def iter_xlsx_frames(source, chunksize=CSV_CHUNK_SIZE, sheets=None):
+    """
+    Stream an XLSX workbook as a sequence of FRAME_COLUMNS DataFrames.
+
+    Uses openpyxl's read-only mode, which reads rows straight from the
+    file instead of loading the whole workbook, so memory is bounded by
+    ``chunksize``. The header row and date format are detected once per
+    sheet.
+
+    Args:
+        source (str or file): Path or binary file object of the workbook
+        chunksize (int): Rows per chunk
+        sheets (list): Names of the sheets to read; all sheets when None
+
+    Yields:
+        pd.DataFrame: Columns FRAME_COLUMNS, with parse_date_column() info
+        in ``frame.attrs['dates']`` and the sheet name in
+        ``frame.attrs['sheet']``
     """
     try:
-        # Read Excel file
-        df = pd.read_excel(io.BytesIO(file_content))
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        try:
+            if sheets:
+                missing = [name for name in sheets if name not in workbook.sheetnames]
+                if missing:
+                    raise ValueError(f"Sheets not found: {', '.join(missing)}")
+                worksheets = [workbook[name] for name in sheets]
+            else:
+                worksheets = workbook.worksheets
+
+            found = False
+            for worksheet in worksheets:
+                for frame in _iter_sheet_frames(worksheet, chunksize):
+                    found = True
+                    yield frame
+            if not found:
+                raise ValueError("Could not find date or description columns in Excel file")
+        finally:
+            workbook.close()
 
-        # Convert column names to lowercase
-        df.columns = df.columns.str.lower().str.strip()
+    except Exception as e:
+        raise ValueError(f"Error parsing Excel file: {str(e)}")
 
-        # Find relevant columns (same logic as CSV)
-        date_col = None
-        desc_col = None
-        credit_col = None
-        debit_col = None
+def read_statement_sample(path, rows=DATE_SAMPLE_SIZE):
+    """
+    Read the header and first rows of a CSV or XLSX statement.
 
-        for col in df.columns:
-            if not date_col and any(x in col for x in ['date', 'trans date', 'transaction date', 'posted date']):
-                date_col = col
-            elif not desc_col and any(x in col for x in ['description', 'merchant', 'vendor', 'detail']):
-                desc_col = col
-            elif not credit_col and any(x in col for x in ['credit', 'payment', 'deposit']):
-                credit_col = col
-            elif not debit_col and any(x in col for x in ['debit', 'charge', 'amount', 'purchase', 'withdrawal']):
-                debit_col = col
+    For workbooks, the first sheet with a recognizable header is used.
 
-        if not date_col or not desc_col:
-            raise ValueError("Could not find date or description columns in Excel file")
+    Returns:
+        pd.DataFrame: Up to ``rows`` raw rows with normalized column names
+    """
+    if path.lower().endswith('.csv'):
+        df = pd.read_csv(path, nrows=rows, encoding='utf-8')
+        df.columns = normalize_columns(df.columns)
+        return df
 
-        expenses = []
-        for _, row in df.iterrows():
-            expense = {
-                'date': parse_date(row[date_col]),
-                'description': str(row[desc_col]).strip(),
-                'credit': clean_amount(row[credit_col]) if credit_col else 0.0,
-                'debit': clean_amount(row[debit_col]) if debit_col else 0.0
-            }
-
-            # Skip rows with no description
-            if expense['description'] and expense['description'] != 'nan':
-                expenses.append(expense)
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            rows_iter = worksheet.iter_rows(values_only=True)
+            for _, row in zip(range(XLSX_HEADER_SCAN_ROWS), rows_iter):
+                header = _sheet_header(row)
+                if resolve_profile(header) is not None:
+                    sample = [r for _, r in zip(range(rows), rows_iter)]
+                    sample = [tuple(r[:len(header)]) + (None,) * (len(header) - len(r)) for r in sample]
+                    return pd.DataFrame(sample, columns=header)
+    finally:
+        workbook.close()
+    raise ValueError("Could not find date or description columns in Excel file")
+
+def parse_xlsx_frame(file_content, sheets=None):
+    """
+    Parse an XLSX workbook into a FRAME_COLUMNS DataFrame.
 
-        return expenses
+    Reads every sheet with a statement header (or just ``sheets``).
+    """
+    frames = list(iter_xlsx_frames(io.BytesIO(file_content), sheets=sheets))
+    frame = pd.concat(frames, ignore_index=True)
+    frame.attrs['dates'] = merge_date_info(f.attrs.get('dates') for f in frames)
+    return frame
+
+def parse_xls_frame(file_content):
+    """
+    Parse a legacy .xls workbook (first sheet) into a FRAME_COLUMNS DataFrame.
+    """
+    try:
+        df = pd.read_excel(io.BytesIO(file_content))
+        return statement_frame(df, 'Excel file')
 
     except Exception as e:
         raise ValueError(f"Error parsing Excel file: {str(e)}")
 
+def parse_xlsx(file_content):
+    """
+    Parse XLSX/Excel file and extract expense data.
+
+    Returns:
+        list: List of expense dictionaries
+    """
+    return frame_to_expenses(parse_xlsx_frame(file_content))
+
 def parse_file(file_content, filename):
     """
     Parse uploaded file based on extension.
@@ -270,13 +878,103 @@ def parse_file(file_content, filename):
     Returns:
         list: List of expense dictionaries
     """
+    return frame_to_expenses(parse_file_frame(file_content, filename))
+
+def _cache_version():
+    """Parser version for parse cache keys; bank profiles change the parse."""
+    return f'{PARSER_VERSION}.{registry_version()}'
+
+def _cached_frame(entry):
+    """FRAME_COLUMNS DataFrame of a parse cache entry."""
+    frame = pd.DataFrame(entry['columns'], columns=FRAME_COLUMNS)
+    frame.attrs['dates'] = entry['dates']
+    return frame
+
+def iter_xlsx_file_frames(path, sheets=None, use_cache=True):
+    """
+    Stream an XLSX workbook on disk, through the parse cache.
+
+    The file is hashed in blocks first. On a hit the cached rows come back
+    as one frame; on a miss the workbook is streamed with
+    iter_xlsx_frames() and, if it has at most CACHE_MAX_STREAMED_ROWS rows,
+    stored once the last chunk has been read. Whole-workbook entries are
+    shared with parse_file_frame().
+
+    Args:
+        path (str): Workbook on disk
+        sheets (list): Names of the sheets to read; all sheets when None
+        use_cache (bool): Consult and fill the parse cache
+
+    Yields:
+        pd.DataFrame: Columns FRAME_COLUMNS, with parse_date_column() info
+        in ``frame.attrs['dates']``
+    """
+    if not use_cache:
+        yield from iter_xlsx_frames(path, sheets=sheets)
+        return
+
+    version = _cache_version()
+    if sheets:
+        version += '.' + hashlib.sha1('\0'.join(sheets).encode('utf-8')).hexdigest()[:8]
+    key = parse_cache.file_cache_key(path, 'xlsx', version)
+    entry = parse_cache.get(key)
+    if entry is not None:
+        yield _cached_frame(entry)
+        return
+
+    columns = {column: [] for column in FRAME_COLUMNS}
+    dates = []
+    rows = 0
+    for frame in iter_xlsx_frames(path, sheets=sheets):
+        rows += len(frame)
+        if rows <= CACHE_MAX_STREAMED_ROWS:
+            for column in FRAME_COLUMNS:
+                columns[column].extend(frame[column].tolist())
+            dates.append(frame.attrs.get('dates'))
+        yield frame
+
+    if rows <= CACHE_MAX_STREAMED_ROWS:
+        parse_cache.put(key, {'columns': columns, 'dates': merge_date_info(dates)})
+
+def parse_file_frame(file_content, filename, use_cache=True, executor=None):
+    """
+    Parse uploaded file into a FRAME_COLUMNS DataFrame.
+
+    Results are cached by content (see parse_cache), so uploading the same
+    file again skips extraction and parsing entirely.
+
+    Args:
+        file_content (bytes): File content
+        filename (str): Original filename
+        use_cache (bool): Consult and fill the parse cache
+        executor (ProcessPoolExecutor): Pool for PDF text extraction
+
+    Returns:
+        pd.DataFrame: Columns date, description, credit, debit
+    """
     extension = filename.lower().split('.')[-1]
 
+    key = None
+    if use_cache:
+        key = parse_cache.cache_key(file_content, extension, _cache_version())
+        entry = parse_cache.get(key)
+        if entry is not None:
+            return _cached_frame(entry)
+
     if extension == 'csv':
-        return parse_csv(file_content)
+        frame = parse_csv_frame(file_content)
     elif extension == 'pdf':
-        return parse_pdf(file_content)
-    elif extension in ['xlsx', 'xls']:
-        return parse_xlsx(file_content)
+        frame = pd.DataFrame(parse_pdf(file_content, executor=executor), columns=FRAME_COLUMNS)
+    elif extension == 'xlsx':
+        frame = parse_xlsx_frame(file_content)
+    elif extension == 'xls':
+        frame = parse_xls_frame(file_content)
     else:
         raise ValueError(f"Unsupported file format: {extension}")
+
+    if key is not None:
+        parse_cache.put(key, {
+            'columns': frame.to_dict('list'),
+            'dates': frame.attrs.get('dates')
+        })
+    return frame
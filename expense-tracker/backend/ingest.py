@@ -0,0 +1,287 @@
+"""
+Upload ingestion pipeline: spool, parse, categorize and store a statement.
+"""
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from database import insert_expense_chunks, insert_expense_chunk_groups
+from file_parser import (
+    iter_csv_frames, iter_xlsx_file_frames, merge_date_info, parse_file_frame
+)
+from categorizer import determine_person
+import merchant_cache
+
+# Formats parsed chunk by chunk straight from disk; the rest are read whole
+STREAMING_EXTENSIONS = ('csv', 'xlsx')
+
+# Statement formats accepted on their own or inside a ZIP archive
+SUPPORTED_EXTENSIONS = ('csv', 'pdf', 'xlsx', 'xls')
+
+# Files of a batch upload parsed at the same time
+BATCH_PARSE_WORKERS = 4
+
+def file_extension(filename):
+    return filename.lower().split('.')[-1]
+
+def spool_upload(file_storage, folder):
+    """
+    Copy an uploaded file to a temporary file in ``folder``.
+
+    The request body is streamed to disk in blocks, so large uploads never
+    sit in memory. The caller is responsible for deleting the file.
+
+    Returns:
+        str: Path of the spooled file
+    """
+    os.makedirs(folder, exist_ok=True)
+    suffix = '.' + file_extension(file_storage.filename)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=folder)
+    with os.fdopen(fd, 'wb') as f:
+        file_storage.save(f)
+    return path
+
+def expand_zip(path, folder, max_bytes):
+    """
+    Extract the statement files of a ZIP archive to temporary files.
+
+    Directories, hidden files and unsupported formats are skipped. The
+    caller is responsible for deleting the extracted files.
+
+    Args:
+        path (str): ZIP file on disk
+        folder (str): Directory for the extracted files
+        max_bytes (int): Largest total uncompressed size accepted
+
+    Returns:
+        list: (path, filename) of each extracted statement
+    """
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid ZIP file: {str(e)}")
+
+    with archive:
+        members = []
+        for member in archive.infolist():
+            filename = os.path.basename(member.filename)
+            if member.is_dir() or not filename or filename.startswith('.'):
+                continue
+            if '__MACOSX' in member.filename.split('/'):
+                continue
+            if file_extension(filename) in SUPPORTED_EXTENSIONS:
+                members.append((member, filename))
+
+        if sum(member.file_size for member, _ in members) > max_bytes:
+            raise ValueError("ZIP contents are too large")
+
+        extracted = []
+        try:
+            for member, filename in members:
+                fd, member_path = tempfile.mkstemp(
+                    suffix='.' + file_extension(filename), dir=folder
+                )
+                extracted.append((member_path, filename))
+                with os.fdopen(fd, 'wb') as f, archive.open(member) as source:
+                    shutil.copyfileobj(source, f)
+        except Exception:
+            for member_path, _ in extracted:
+                os.remove(member_path)
+            raise
+    return extracted
+
+def iter_statement_frames(path, filename, executor=None, sheets=None):
+    """
+    Parse a statement file into FRAME_COLUMNS DataFrames.
+
+    Streaming formats yield one frame per chunk; others yield a single frame.
+
+    Args:
+        executor (ProcessPoolExecutor): Pool for PDF text extraction
+        sheets (list): XLSX sheets to read; all sheets when None
+    """
+    extension = file_extension(filename)
+    if extension == 'csv':
+        yield from iter_csv_frames(path)
+    elif extension == 'xlsx':
+        yield from iter_xlsx_file_frames(path, sheets=sheets)
+    else:
+        with open(path, 'rb') as f:
+            file_content = f.read()
+        yield parse_file_frame(file_content, filename, executor=executor)
+
+def categorized_columns(frame, person):
+    """
+    Categorize a parsed statement frame.
+
+    Returns:
+        dict: Column batch for database.insert_expense_columns
+    """
+    descriptions = frame['description'].tolist()
+    classified = merchant_cache.classify_many(descriptions)
+    return {
+        'date': frame['date'],
+        'description': descriptions,
+        'category': [category for category, _ in classified],
+        'credit': frame['credit'],
+        'debit': frame['debit'],
+        'person': person,
+        'provider': [provider for _, provider in classified],
+        'rules_version': merchant_cache.classifier_version()
+    }
+
+def ingest_frames(frames, person, progress=None):
+    """
+    Categorize and store parsed statement frames in one transaction.
+
+    Frames are consumed lazily, so a generator that parses the next chunk
+    only runs once the previous chunk has been written. Parse errors raise
+    ValueError and roll the whole file back.
+
+    Args:
+        frames (iterable): FRAME_COLUMNS DataFrames
+        person (str): Owner of the expenses
+        progress (callable): Called as progress(rows_seen, rows_inserted)
+            after every insert batch
+
+    Returns:
+        dict: count (rows inserted), duplicates, person and date_info
+    """
+    date_infos = []
+
+    def chunks():
+        for frame in frames:
+            date_infos.append(frame.attrs.get('dates'))
+            yield categorized_columns(frame, person)
+
+    inserted, duplicates = insert_expense_chunks(chunks(), progress=progress)
+    return {
+        'count': inserted,
+        'duplicates': duplicates,
+        'person': person,
+        'date_info': merge_date_info(date_infos)
+    }
+
+def ingest_file(path, filename, person=None, sheets=None):
+    """
+    Parse, categorize and store a statement file in one transaction.
+
+    Chunks are parsed, categorized and inserted one after another, so peak
+    memory is bounded by the chunk size rather than the file size.
+
+    Args:
+        path (str): Path of the file on disk
+        filename (str): Original filename (format and person detection)
+        person (str): Owner of the expenses; detected from filename if None
+        sheets (list): XLSX sheets to read; all sheets when None
+
+    Returns:
+        dict: count (rows inserted), duplicates, person and date_info
+    """
+    if person is None:
+        person = determine_person(filename)
+    return ingest_frames(iter_statement_frames(path, filename, sheets=sheets), person)
+
+def _parse_statement(path, filename, executor):
+    """Parse one file of a batch, timing it and capturing parse errors."""
+    started = time.perf_counter()
+    parsed = {
+        'filename': filename,
+        'person': determine_person(filename),
+        'frames': [],
+        'error': None
+    }
+    try:
+        parsed['frames'] = list(iter_statement_frames(path, filename, executor))
+    except ValueError as e:
+        parsed['error'] = f'Error parsing file: {str(e)}'
+    parsed['parse_seconds'] = round(time.perf_counter() - started, 3)
+    return parsed
+
+def parse_statements(files, workers=BATCH_PARSE_WORKERS, executor=None):
+    """
+    Parse a batch of statement files concurrently.
+
+    The owner of each file is detected from its own filename. A file that
+    cannot be parsed gets an error message instead of frames.
+
+    Args:
+        files (list): (path, filename) pairs
+        workers (int): Files parsed at the same time
+        executor (ProcessPoolExecutor): Pool for PDF text extraction
+
+    Returns:
+        list: Per file, in order: filename, person, frames, parse_seconds
+        and error
+    """
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        return list(pool.map(
+            lambda file: _parse_statement(file[0], file[1], executor), files
+        ))
+
+def ingest_parsed(parsed, progress=None):
+    """
+    Categorize and store parsed batch files in one transaction.
+
+    Files that failed to parse are reported and left out.
+
+    Args:
+        parsed (list): Output of parse_statements()
+        progress (callable): Called as progress(rows_seen, rows_inserted)
+
+    Returns:
+        dict: count, duplicates, ingest_seconds and per-file results
+    """
+    ok = [item for item in parsed if item['error'] is None]
+
+    def chunks(item):
+        for frame in item['frames']:
+            yield categorized_columns(frame, item['person'])
+
+    started = time.perf_counter()
+    counts = insert_expense_chunk_groups((chunks(item) for item in ok), progress=progress)
+    ingest_seconds = round(time.perf_counter() - started, 3)
+
+    counts_by_file = dict(zip(map(id, ok), counts))
+    files = []
+    for item in parsed:
+        inserted, duplicates = counts_by_file.get(id(item), (0, 0))
+        files.append({
+            'filename': item['filename'],
+            'person': item['person'],
+            'count': inserted,
+            'duplicates': duplicates,
+            'parse_seconds': item['parse_seconds'],
+            'warnings': date_warnings(
+                merge_date_info([frame.attrs.get('dates') for frame in item['frames']])
+            ),
+            'error': item['error']
+        })
+
+    return {
+        'count': sum(inserted for inserted, _ in counts),
+        'duplicates': sum(duplicates for _, duplicates in counts),
+        'ingest_seconds': ingest_seconds,
+        'files': files
+    }
+
+def date_warnings(date_info):
+    """Describe date-parsing problems reported by the parser, if any."""
+    warnings = []
+    if not date_info:
+        return warnings
+    if date_info['ambiguous']:
+        warnings.append(
+            f"Dates fit both day-first and month-first formats; "
+            f"read them as {date_info['format']}"
+        )
+    if date_info['unparsed']:
+        warnings.append(
+            f"{date_info['unparsed']} dates could not be parsed and were set to today"
+        )
+    return warnings
@@ -13,12 +13,7 @@ def generate_insights(expenses):
         dict: Insights data
     """
     if not expenses:
-        return {
-            'summary': "No expenses recorded yet.",
-            'trends': [],
-            'top_categories': [],
-            'monthly_comparison': {}
-        }
+        return empty_insights()
 
     # Initialize aggregators
     monthly_data = defaultdict(lambda: {'credit': 0, 'debit': 0})
@@ -56,6 +51,63 @@ def generate_insights(expenses):
         provider_data[provider]['credit'] += credit
         provider_data[provider]['debit'] += debit
 
+    return build_insights(monthly_data, category_data, person_data, provider_data)
+
+def generate_insights_from_aggregates(aggregates):
+    """
+    Generate insights from pre-aggregated expense totals.
+
+    Args:
+        aggregates (dict): Output of database.get_expense_aggregates()
+
+    Returns:
+        dict: Insights data (same shape as generate_insights)
+    """
+    if not aggregates['total_count']:
+        return empty_insights()
+
+    monthly_data = {
+        row['month']: {
+            'credit': row['credit'],
+            'debit': row['debit'],
+            'month_name': datetime.strptime(row['month'], '%Y-%m').strftime('%B %Y')
+        }
+        for row in aggregates['monthly']
+    }
+    category_data = {
+        row['category']: {
+            'credit': row['credit'],
+            'debit': row['debit'],
+            'count': int(row['count'])
+        }
+        for row in aggregates['by_category']
+    }
+    person_data = {
+        row['person']: {'credit': row['credit'], 'debit': row['debit']}
+        for row in aggregates['by_person']
+    }
+    provider_data = {
+        row['provider']: {'credit': row['credit'], 'debit': row['debit']}
+        for row in aggregates['by_provider']
+    }
+
+    return build_insights(monthly_data, category_data, person_data, provider_data)
+
+def empty_insights():
+    """
+    Insights returned when there are no expenses.
+    """
+    return {
+        'summary': "No expenses recorded yet.",
+        'trends': [],
+        'top_categories': [],
+        'monthly_comparison': {}
+    }
+
+def build_insights(monthly_data, category_data, person_data, provider_data):
+    """
+    Build the insights payload from monthly, category, person and provider totals.
+    """
     # Calculate trends
     trends = analyze_trends(monthly_data)
 
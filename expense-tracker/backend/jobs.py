@@ -0,0 +1,387 @@
+"""
+Background jobs: uploads are queued and processed off the request thread.
+
+Jobs are recorded in the jobs database (a separate SQLite file, so job
+bookkeeping never waits for an upload's insert transaction) and run on a
+bounded thread pool; PDF text extraction (CPU-bound) goes to a shared
+process pool. An upload's rows are written in one transaction that only
+commits at the end, so live progress is kept in memory and saved to the
+jobs row when the job finishes. A job owns its spooled files and deletes
+them once its outcome is recorded.
+
+Every process that imports the app runs jobs (several WSGI workers share
+the queue). A claimed job is leased to its process, which keeps renewing
+the lease; jobs whose lease runs out because their process died are queued
+again and picked up by whichever process sees them first.
+
+Re-categorization jobs rewrite rows categorized with an older rules version
+in short batches, each taking the write lock only while it is classified
+and written, so uploads and dashboard reads interleave with them.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from database import (
+    create_job, get_job, claim_job, renew_job_leases, finish_job, requeue_jobs,
+    count_stale_expenses, get_stale_expenses, update_expense_categories
+)
+from file_parser import PDF_WORKERS
+from ingest import (
+    STREAMING_EXTENSIONS, file_extension, iter_statement_frames, ingest_frames,
+    parse_statements, ingest_parsed, date_warnings
+)
+from categorizer import determine_person
+import merchant_cache
+import snapshot
+
+# Jobs run at the same time (parsing overlaps; inserts take turns)
+JOB_WORKERS = 2
+
+# Processes shared by all jobs for PDF text extraction
+PDF_PROCESSES = PDF_WORKERS
+
+# Seconds a claimed job stays with its process without a renewal; leases
+# are renewed, and expired ones reclaimed, every LEASE_SECONDS / 3
+LEASE_SECONDS = 60
+
+_lock = threading.Lock()
+_executor = None
+_pdf_executor = None
+_owner = None           # this process's claim token, set by start()
+_stop = None            # set by shutdown() to stop the lease thread
+_submitted = set()      # ids of jobs waiting or running on _executor
+
+# SQLite has a single writer: jobs parse in parallel but insert one at a time
+_write_lock = threading.Lock()
+
+# Rows re-categorized per transaction
+RECATEGORIZE_BATCH = 2000
+
+# job id -> rows processed so far, for running jobs
+_progress = {}
+
+# job id -> rows the job will process, for running jobs that know it
+_totals = {}
+
+def start():
+    """
+    Start the worker pools and the lease thread, and queue any jobs whose
+    process died.
+
+    Safe to call more than once.
+    """
+    global _executor, _pdf_executor, _owner, _stop
+    with _lock:
+        if _executor is not None:
+            return
+        _owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        # Spawned, not forked: forking the multithreaded server process can
+        # leave the children holding locks no thread will release
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=PDF_PROCESSES, mp_context=multiprocessing.get_context('spawn')
+        )
+        _stop = threading.Event()
+        threading.Thread(
+            target=_renew_leases, args=(_stop,), name='job-leases', daemon=True
+        ).start()
+    _submit_queued()
+
+def shutdown(wait=True):
+    """
+    Stop the worker pools. Queued jobs stay queued for the next start(), and
+    running ones are taken over once their lease expires.
+    """
+    global _executor, _pdf_executor
+    with _lock:
+        executor, pdf_executor = _executor, _pdf_executor
+        _executor = _pdf_executor = None
+        if _stop is not None:
+            _stop.set()
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+        pdf_executor.shutdown(wait=wait, cancel_futures=True)
+
+def _submit(job_id):
+    """Run a job on this process's pool, unless it is already waiting there."""
+    with _lock:
+        if _executor is None or job_id in _submitted:
+            return
+        _submitted.add(job_id)
+        future = _executor.submit(_run_job, job_id)
+    future.add_done_callback(lambda _: _submitted.discard(job_id))
+
+def _submit_queued():
+    """Requeue jobs with expired leases and submit every queued job."""
+    for job in requeue_jobs():
+        _submit(job['id'])
+
+def _renew_leases(stop):
+    while not stop.wait(LEASE_SECONDS / 3):
+        try:
+            renew_job_leases(list(_progress), _owner, LEASE_SECONDS)
+            _submit_queued()
+        except Exception:
+            pass  # e.g. jobs database busy; retried on the next round
+
+def submit_upload(path, filename, person=None, sheets=None):
+    """
+    Queue a spooled upload for ingestion.
+
+    The job owns ``path`` and deletes it once the upload has been processed.
+
+    Args:
+        path (str): Spooled file (see ingest.spool_upload)
+        filename (str): Original filename
+        person (str): Owner of the expenses; detected from filename if None
+        sheets (list): XLSX sheets to read; all sheets when None
+
+    Returns:
+        int: The job id
+    """
+    start()
+    job_id = create_job('upload', {
+        'path': path, 'filename': filename, 'person': person, 'sheets': sheets
+    })
+    _submit(job_id)
+    return job_id
+
+def submit_batch(files):
+    """
+    Queue a batch of spooled uploads, stored together in one transaction.
+
+    The job owns the files and deletes them once the batch has been processed.
+
+    Args:
+        files (list): (path, filename) pairs
+
+    Returns:
+        int: The job id
+    """
+    start()
+    job_id = create_job('batch', {
+        'files': [{'path': path, 'filename': filename} for path, filename in files]
+    })
+    _submit(job_id)
+    return job_id
+
+def submit_recategorize():
+    """
+    Queue re-categorization of rows categorized with older rules.
+
+    Returns:
+        int: The job id
+    """
+    start()
+    job_id = create_job('recategorize', {'rules_version': merchant_cache.classifier_version()})
+    _submit(job_id)
+    return job_id
+
+def recategorize(progress=None, batch_size=RECATEGORIZE_BATCH):
+    """
+    Re-categorize every unconfirmed row not categorized with the current
+    rules (see merchant_cache.classifier_version).
+
+    Stale rows are counted first (one scan, off the request path), then
+    read in id order, one batch at a time, classified with
+    merchant_cache.classify_many() and written back in one short
+    transaction per batch. Each batch's classification and write hold
+    _write_lock, since classifying stores new merchant_cache entries;
+    uploads take the lock between batches. Rows whose category and provider are unchanged
+    are only stamped with the new rules version. Invalidates the columnar
+    snapshot if any row changed.
+
+    Args:
+        progress (callable): Called as progress(rows_checked, rows_changed,
+            rows_stale) once the stale rows are counted and after each batch
+        batch_size (int): Rows per batch and transaction
+
+    Returns:
+        dict: rows_stale, rows_checked, rows_changed and rules_version
+    """
+    version = merchant_cache.classifier_version()
+    stale = count_stale_expenses(version)
+    checked = changed = 0
+    if progress:
+        progress(checked, changed, stale)
+    last_id = 0
+    while True:
+        rows = get_stale_expenses(version, last_id, batch_size)
+        if not rows:
+            break
+        # Classifying writes new merchant_cache rows, so it takes its turn
+        # with uploads too
+        with _write_lock:
+            classified = merchant_cache.classify_many(row['description'] for row in rows)
+            updates = [
+                (row['id'], category, provider)
+                for row, (category, provider) in zip(rows, classified)
+            ]
+            changed += update_expense_categories(updates, version, last_id, rows[-1]['id'])
+        checked += len(rows)
+        last_id = rows[-1]['id']
+        if progress:
+            progress(checked, changed, stale)
+
+    if changed:
+        snapshot.invalidate_snapshot()
+    return {
+        'rows_stale': stale,
+        'rows_checked': checked,
+        'rows_changed': changed,
+        'rules_version': version
+    }
+
+def _run_upload(job, progress):
+    params = job['params']
+    path = params['path']
+    filename = params['filename']
+    person = params['person'] or determine_person(filename)
+    frames = iter_statement_frames(
+        path, filename, executor=_pdf_executor, sheets=params.get('sheets')
+    )
+    if file_extension(filename) not in STREAMING_EXTENSIONS:
+        # Parse whole-file formats before waiting for the write lock
+        frames = list(frames)
+    with _write_lock:
+        result = ingest_frames(frames, person, progress)
+
+    return {
+        'message': f"Successfully processed {result['count']} expenses",
+        'count': result['count'],
+        'duplicates': result['duplicates'],
+        'person': result['person'],
+        'warnings': date_warnings(result['date_info'])
+    }
+
+def _run_batch(job, progress):
+    files = [(file['path'], file['filename']) for file in job['params']['files']]
+    started = time.perf_counter()
+    parsed = parse_statements(files, executor=_pdf_executor)
+    parse_seconds = round(time.perf_counter() - started, 3)
+    with _write_lock:
+        result = ingest_parsed(parsed, progress)
+
+    failed = sum(1 for file in result['files'] if file['error'])
+    message = f"Successfully processed {result['count']} expenses from {len(files) - failed} files"
+    if failed:
+        message += f" ({failed} failed)"
+    return {
+        'message': message,
+        'count': result['count'],
+        'duplicates': result['duplicates'],
+        'parse_seconds': parse_seconds,
+        'ingest_seconds': result['ingest_seconds'],
+        'files': result['files']
+    }
+
+def _run_recategorize(job, progress):
+    # Always brings rows up to the current rules, even if they changed after queueing
+    result = recategorize(progress)
+    result['message'] = (
+        f"Re-categorized {result['rows_changed']} of {result['rows_checked']} expenses"
+    )
+    return result
+
+# Job kind -> function(job, progress) returning the job result
+JOB_RUNNERS = {
+    'upload': _run_upload,
+    'batch': _run_batch,
+    'recategorize': _run_recategorize,
+}
+
+def _remove_files(job):
+    """Delete the spooled files a job owns."""
+    params = job['params']
+    if job['kind'] == 'batch':
+        paths = [file['path'] for file in params['files']]
+    else:
+        paths = [params['path']] if params.get('path') else []
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _run_job(job_id):
+    job = get_job(job_id)
+    if job is None or job['status'] != 'queued':
+        return
+
+    def progress(rows_processed, rows_inserted, rows_total=None):
+        _progress[job_id] = rows_processed
+        if rows_total is not None:
+            _totals[job_id] = rows_total
+
+    claimed = False
+    result = None
+    error = None
+    try:
+        claimed = claim_job(job_id, _owner, LEASE_SECONDS) is not None
+        if not claimed:
+            return  # claimed by another runner
+        _progress[job_id] = 0
+        result = JOB_RUNNERS[job['kind']](job, progress)
+    except ValueError as e:
+        error = f'Error parsing file: {str(e)}'
+    except Exception as e:
+        error = str(e)
+    finally:
+        _totals.pop(job_id, None)
+        rows_processed = _progress.pop(job_id, 0)
+        # A job that could not be claimed fails too, rather than stay queued
+        # If the outcome cannot be recorded the files are kept: the job runs
+        # again once its lease expires
+        if claimed or error is not None:
+            owner = _owner if claimed else None
+            if finish_job(job_id, owner, rows_processed, result=result, error=error):
+                _remove_files(job)
+
+def job_status(job_id):
+    """
+    Status of a job for the API.
+
+    For re-categorization jobs rows_processed counts rows checked so far
+    and rows_total the stale rows to check (None until they are counted).
+
+    Returns:
+        dict: id, kind, status, filename, file_count, rows_processed, rows_total,
+        elapsed_seconds, rows_per_second, result, error and created_at; None
+        if not found
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+
+    rows_processed = job['rows_processed']
+    rows_total = (job['result'] or {}).get('rows_stale')
+    if job['status'] == 'running':
+        rows_processed = _progress.get(job_id, rows_processed)
+        rows_total = _totals.get(job_id)
+
+    if job['kind'] == 'batch':
+        file_count = len(job['params']['files'])
+    else:
+        file_count = 1 if job['kind'] == 'upload' else 0
+
+    elapsed = None
+    if job['started_at'] is not None:
+        elapsed = (job['finished_at'] or time.time()) - job['started_at']
+
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'filename': job['params'].get('filename'),
+        'file_count': file_count,
+        'rows_processed': rows_processed,
+        'rows_total': rows_total,
+        'elapsed_seconds': round(elapsed, 3) if elapsed is not None else None,
+        'rows_per_second': round(rows_processed / elapsed, 1) if elapsed else None,
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat()
+    }
@@ -0,0 +1,281 @@
+"""
+Learned fallback tier for the keyword categorizer.
+
+A multinomial logistic regression over hashed character n-grams, in plain
+NumPy, trained on expenses whose category a user confirmed. It is only
+asked about descriptions the keyword rules leave in 'miscellaneous', and
+only answers when it is at least MIN_CONFIDENCE sure.
+
+The model is a few hundred KB of .npy files in MODEL_DIR. It is loaded
+lazily with mmap_mode='r', so importing this module and starting the app
+cost nothing, and reloaded when a newer model is saved (e.g. by
+``python manage.py train-categorizer`` in another process).
+
+Inference is batched: predict_many() featurizes a whole upload's
+descriptions in one pass over their concatenated bytes and scores them with
+one gather from the weight matrix. Budget: PREDICT_BUDGET_US per row
+(bench_categorizer.py measures it).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models', 'categorizer')
+
+MODEL_FORMAT = 1
+
+# Hashed feature space (a power of two) and character n-gram lengths
+N_FEATURES = 2 ** 13
+NGRAM_SIZES = (3, 4, 5)
+
+# Predictions below this probability are left as 'miscellaneous'; well above
+# the class priors an unfamiliar description scores
+MIN_CONFIDENCE = 0.8
+
+# Smallest training set accepted by train()
+MIN_TRAINING_ROWS = 20
+
+# Per-row inference budget in microseconds, for batches of a statement's size
+PREDICT_BUDGET_US = 50
+
+_FNV_OFFSET = np.uint32(2166136261)
+_FNV_PRIME = np.uint32(16777619)
+
+_DIGITS = re.compile(r'\d+')
+
+_lock = threading.Lock()
+_model = None           # dict with weights, bias, classes and version
+_model_mtime = None     # mtime of the meta.json the model was loaded from
+
+def _normalize(description):
+    """Lowercase and drop digits (store numbers, dates, card suffixes)."""
+    return ' '.join(_DIGITS.sub(' ', description.lower()).split())
+
+def featurize(descriptions):
+    """
+    Hashed character n-grams of a batch of descriptions.
+
+    All descriptions are hashed together: the n-grams of their concatenated
+    bytes are computed with vectorized FNV-1a, and those spanning two
+    descriptions are dropped. Every description's feature vector has unit
+    L2 norm.
+
+    Args:
+        descriptions (list): Expense descriptions
+
+    Returns:
+        tuple: (rows, features, values) arrays, one entry per n-gram
+    """
+    encoded = [f' {_normalize(description)} '.encode('utf-8') for description in descriptions]
+    lengths = np.fromiter(map(len, encoded), np.int64, len(encoded))
+    data = np.frombuffer(b''.join(encoded), np.uint8).astype(np.uint32)
+    byte_rows = np.repeat(np.arange(len(encoded)), lengths)
+
+    rows = []
+    features = []
+    for n in NGRAM_SIZES:
+        count = len(data) - n + 1
+        if count <= 0:
+            continue
+        hashes = np.full(count, _FNV_OFFSET ^ np.uint32(n), np.uint32)
+        for k in range(n):
+            hashes ^= data[k:k + count]
+            hashes *= _FNV_PRIME
+        within = byte_rows[:count] == byte_rows[n - 1:n - 1 + count]
+        rows.append(byte_rows[:count][within])
+        features.append(hashes[within] & np.uint32(N_FEATURES - 1))
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, np.int64)
+    features = np.concatenate(features).astype(np.int64) if features else np.zeros(0, np.int64)
+    counts = np.bincount(rows, minlength=len(encoded))
+    values = 1.0 / np.sqrt(np.maximum(counts, 1))[rows]
+    return rows, features, values.astype(np.float32)
+
+def _scores(weights, bias, rows, features, values, n_rows):
+    """Linear scores, shape (n_rows, n_classes)."""
+    scores = np.tile(np.asarray(bias, np.float32), (n_rows, 1))
+    np.add.at(scores, rows, weights[features] * values[:, None])
+    return scores
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+def train(descriptions, categories, epochs=200, learning_rate=4.0, l2=1e-4):
+    """
+    Fit the model by full-batch gradient descent on the softmax loss.
+
+    Args:
+        descriptions (list): Expense descriptions
+        categories (list): Confirmed category of each description
+        epochs (int): Gradient steps
+        learning_rate (float): Step size
+        l2 (float): Weight decay
+
+    Returns:
+        dict: weights, bias, classes and training accuracy
+
+    Raises:
+        ValueError: Fewer than MIN_TRAINING_ROWS rows or fewer than two categories
+    """
+    if len(descriptions) < MIN_TRAINING_ROWS:
+        raise ValueError(
+            f"Need at least {MIN_TRAINING_ROWS} confirmed expenses to train, "
+            f"found {len(descriptions)}"
+        )
+    classes = sorted(set(categories))
+    if len(classes) < 2:
+        raise ValueError("Confirmed expenses must cover at least two categories")
+
+    index = {category: i for i, category in enumerate(classes)}
+    labels = np.array([index[category] for category in categories])
+    targets = np.zeros((len(labels), len(classes)), np.float32)
+    targets[np.arange(len(labels)), labels] = 1.0
+
+    rows, features, values = featurize(descriptions)
+    weights = np.zeros((N_FEATURES, len(classes)), np.float32)
+    bias = np.zeros(len(classes), np.float32)
+    for _ in range(epochs):
+        probs = _softmax(_scores(weights, bias, rows, features, values, len(labels)))
+        delta = (probs - targets) / len(labels)
+        gradient = l2 * weights
+        np.add.at(gradient, features, delta[rows] * values[:, None])
+        weights -= learning_rate * gradient
+        bias -= learning_rate * delta.sum(axis=0)
+
+    predicted = _scores(weights, bias, rows, features, values, len(labels)).argmax(axis=1)
+    return {
+        'weights': weights,
+        'bias': bias,
+        'classes': classes,
+        'accuracy': float((predicted == labels).mean())
+    }
+
+def save_model(model, directory=None, rows=None):
+    """
+    Write a trained model to ``directory`` (default MODEL_DIR).
+
+    meta.json is written last and atomically, so a reader never pairs it
+    with half-written weights.
+
+    Returns:
+        str: The model version (hash of its contents)
+    """
+    directory = directory or MODEL_DIR
+    os.makedirs(directory, exist_ok=True)
+    weights = np.ascontiguousarray(model['weights'], np.float32)
+    bias = np.ascontiguousarray(model['bias'], np.float32)
+
+    digest = hashlib.sha1(weights.tobytes())
+    digest.update(bias.tobytes())
+    digest.update(json.dumps(model['classes']).encode('utf-8'))
+    version = digest.hexdigest()[:12]
+
+    # Versioned file names, so processes that mapped the old model keep
+    # reading it until they notice the new meta.json
+    for name, array in (('weights', weights), ('bias', bias)):
+        np.save(os.path.join(directory, f'{name}-{version}.npy'), array)
+
+    meta_path = os.path.join(directory, 'meta.json')
+    previous = _read_meta(directory)
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': MODEL_FORMAT,
+            'version': version,
+            'classes': model['classes'],
+            'n_features': N_FEATURES,
+            'ngram_sizes': list(NGRAM_SIZES),
+            'rows': rows,
+            'accuracy': model.get('accuracy'),
+            'trained_at': time.time()
+        }, f)
+    os.replace(tmp_path, meta_path)
+
+    if previous is not None and previous['version'] != version:
+        for name in ('weights', 'bias'):
+            try:
+                os.remove(os.path.join(directory, f"{name}-{previous['version']}.npy"))
+            except FileNotFoundError:
+                pass
+    return version
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (meta.get('format') != MODEL_FORMAT or meta.get('n_features') != N_FEATURES
+            or meta.get('ngram_sizes') != list(NGRAM_SIZES)):
+        return None
+    return meta
+
+def _current_model():
+    """The saved model, memory-mapped; None if there is none."""
+    global _model, _model_mtime
+    try:
+        mtime = os.stat(os.path.join(MODEL_DIR, 'meta.json')).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with _lock:
+        if mtime != _model_mtime:
+            model = None
+            meta = _read_meta(MODEL_DIR) if mtime is not None else None
+            if meta is not None:
+                version = meta['version']
+                try:
+                    model = {
+                        'weights': np.load(
+                            os.path.join(MODEL_DIR, f'weights-{version}.npy'), mmap_mode='r'
+                        ),
+                        'bias': np.load(os.path.join(MODEL_DIR, f'bias-{version}.npy')),
+                        'classes': meta['classes'],
+                        'version': version
+                    }
+                except OSError:
+                    # Replaced while loading: retry on the next call
+                    model = mtime = None
+            _model, _model_mtime = model, mtime
+        return _model
+
+def model_version():
+    """Version of the saved model, or None when no model has been trained."""
+    model = _current_model()
+    return model['version'] if model is not None else None
+
+def predict_many(descriptions, min_confidence=MIN_CONFIDENCE):
+    """
+    Predict categories for a batch of descriptions.
+
+    Args:
+        descriptions (list): Expense descriptions
+        min_confidence (float): Smallest probability to accept a prediction
+
+    Returns:
+        list: Category per description, or None where there is no model,
+        the model is unsure, or it predicts 'miscellaneous'
+    """
+    model = _current_model()
+    if model is None or not descriptions:
+        return [None] * len(descriptions)
+
+    rows, features, values = featurize(descriptions)
+    probs = _softmax(_scores(
+        model['weights'], model['bias'], rows, features, values, len(descriptions)
+    ))
+    best = probs.argmax(axis=1)
+    confident = probs[np.arange(len(best)), best] >= min_confidence
+
+    classes = model['classes']
+    return [
+        classes[label] if ok and classes[label] != 'miscellaneous' else None
+        for label, ok in zip(best.tolist(), confident.tolist())
+    ]
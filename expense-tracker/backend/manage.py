@@ -0,0 +1,170 @@
+"""
+Maintenance commands for the expense database.
+
+Usage:
+    python manage.py rebuild-rollup
+    python manage.py check-rollup
+    python manage.py snapshot [--full] [--dir DIR]
+    python manage.py recategorize
+    python manage.py train-categorizer
+    python manage.py list-profiles
+    python manage.py save-profile FILE --name NAME [--sign SIGN] [--date-format FMT]
+        [--date COL] [--description COL] [--credit COL] [--debit COL] [--amount COL]
+"""
+import argparse
+import sys
+
+import bank_profiles
+import database
+import file_parser
+import jobs
+import learned_categorizer
+import snapshot
+
+def rebuild_rollup(args):
+    """Recompute the monthly rollup table from the expenses table."""
+    count = database.rebuild_rollup()
+    print(f"Rebuilt expense_rollup: {count} groups")
+    return 0
+
+def check_rollup(args):
+    """Report groups where the rollup disagrees with the expenses table."""
+    mismatches = database.check_rollup_consistency()
+    if not mismatches:
+        print("expense_rollup is consistent with expenses")
+        return 0
+
+    for mismatch in mismatches:
+        print(
+            f"{mismatch['month']} {mismatch['category']} / {mismatch['person']} / "
+            f"{mismatch['provider']}: expected {mismatch['expected']}, "
+            f"found {mismatch['actual']}"
+        )
+    print(f"{len(mismatches)} inconsistent groups; run 'python manage.py rebuild-rollup'")
+    return 1
+
+def export_snapshot(args):
+    """Write or incrementally refresh the columnar expenses snapshot."""
+    result = snapshot.export_snapshot(args.dir, full=args.full)
+    mode = 'rebuilt' if result['full'] else 'refreshed'
+    print(f"Snapshot {mode} in {args.dir}: {result['rows']} rows ({result['appended']} new)")
+    return 0
+
+def recategorize(args):
+    """Re-categorize expenses stored with older categorization rules."""
+    def progress(checked, changed, stale):
+        if stale:
+            print(f"\r{checked}/{stale} checked, {changed} changed", end='', flush=True)
+
+    result = jobs.recategorize(progress)
+    if not result['rows_stale']:
+        print(f"All expenses use rules version {result['rules_version']}")
+        return 0
+    print()
+    print(
+        f"Re-categorized {result['rows_changed']} of {result['rows_checked']} "
+        f"expenses (rules version {result['rules_version']})"
+    )
+    return 0
+
+def train_categorizer(args):
+    """Train the learned categorizer on user-confirmed categories."""
+    descriptions, categories = database.get_confirmed_categories()
+    try:
+        model = learned_categorizer.train(descriptions, categories, epochs=args.epochs)
+    except ValueError as e:
+        print(f"Cannot train: {e}")
+        return 1
+    version = learned_categorizer.save_model(model, rows=len(descriptions))
+    print(
+        f"Trained model {version} on {len(descriptions)} expenses in "
+        f"{len(model['classes'])} categories (training accuracy {model['accuracy']:.1%})"
+    )
+    print("Run 'python manage.py recategorize' to apply it to stored expenses")
+    return 0
+
+def list_profiles(args):
+    """List the registered bank statement formats."""
+    for profile in bank_profiles.list_profiles():
+        if profile.get('amount'):
+            amounts = f"amount={profile['amount']} ({profile['sign']})"
+        else:
+            amounts = f"credit={profile.get('credit')} debit={profile.get('debit')}"
+        print(
+            f"{bank_profiles.header_fingerprint(profile['header'])}  {profile['name']}: "
+            f"date={profile['date']} ({profile.get('date_format') or 'inferred'}) "
+            f"description={profile['description']} {amounts}"
+        )
+    return 0
+
+def save_profile(args):
+    """Save the format of a CSV/XLSX statement as a bank profile."""
+    try:
+        sample = file_parser.read_statement_sample(args.file)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {args.file}: {e}")
+        return 1
+
+    detected = file_parser.resolve_profile(sample.columns) or {}
+    profile = {
+        'name': args.name,
+        'header': list(sample.columns),
+        'sign': args.sign,
+    }
+    for key in bank_profiles.PROFILE_COLUMNS:
+        profile[key] = getattr(args, key) or detected.get(key)
+    if args.sign != bank_profiles.SIGN_SPLIT:
+        # A signed amount column replaces separate credit/debit columns
+        profile['amount'] = profile['amount'] or detected.get('debit')
+        profile['credit'] = profile['debit'] = None
+
+    profile['date_format'] = args.date_format
+    if not args.date_format and profile.get('date') in sample.columns:
+        values = sample[profile['date']].dropna().astype(str)
+        profile['date_format'], ambiguous = file_parser.infer_date_format(values)
+        if ambiguous:
+            print(f"Dates are ambiguous; assuming {profile['date_format']} (use --date-format)")
+
+    try:
+        fingerprint = bank_profiles.save_profile(profile)
+    except ValueError as e:
+        print(f"Invalid profile: {e}")
+        return 1
+    print(f"Saved profile '{args.name}' ({fingerprint})")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('rebuild-rollup', help=rebuild_rollup.__doc__).set_defaults(func=rebuild_rollup)
+    subparsers.add_parser('check-rollup', help=check_rollup.__doc__).set_defaults(func=check_rollup)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help=export_snapshot.__doc__)
+    snapshot_parser.add_argument('--full', action='store_true', help='rebuild instead of appending')
+    snapshot_parser.add_argument('--dir', default=snapshot.SNAPSHOT_DIR, help='snapshot directory')
+    snapshot_parser.set_defaults(func=export_snapshot)
+
+    subparsers.add_parser('recategorize', help=recategorize.__doc__).set_defaults(func=recategorize)
+    train_parser = subparsers.add_parser('train-categorizer', help=train_categorizer.__doc__)
+    train_parser.add_argument('--epochs', type=int, default=200, help='gradient descent steps')
+    train_parser.set_defaults(func=train_categorizer)
+
+    subparsers.add_parser('list-profiles', help=list_profiles.__doc__).set_defaults(func=list_profiles)
+
+    profile_parser = subparsers.add_parser('save-profile', help=save_profile.__doc__)
+    profile_parser.add_argument('file', help='CSV or XLSX statement in the new format')
+    profile_parser.add_argument('--name', required=True, help='profile name, e.g. the bank')
+    profile_parser.add_argument('--sign', choices=bank_profiles.SIGN_CONVENTIONS,
+                                default=bank_profiles.SIGN_SPLIT,
+                                help='how amounts are signed (default: split credit/debit columns)')
+    profile_parser.add_argument('--date-format', help='strptime format of the date column')
+    for key in bank_profiles.PROFILE_COLUMNS:
+        profile_parser.add_argument(f'--{key}', help=f'{key} column (default: detected)')
+    profile_parser.set_defaults(func=save_profile)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
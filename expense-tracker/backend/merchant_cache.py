@@ -0,0 +1,169 @@
+"""
+Two-tier cache of category and provider per merchant.
+
+Statements repeat the same merchants with different store numbers, card
+suffixes and dates, so descriptions are reduced to a merchant key first,
+and the key itself is what gets classified: every description with the
+same key gets the same answer, whichever arrived first.
+Keys are looked up in a bounded in-process LRU, then in the SQLite
+merchant_cache table, and only classified when both miss: with the keyword
+rules, then with the learned categorizer for merchants the rules leave in
+'miscellaneous'. Entries are tagged with classifier_version(), so changing
+the rules (and calling reload_rules()) or training a new model invalidates
+them.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import categorizer
+import learned_categorizer
+from database import (
+    get_merchant_categories, put_merchant_categories, confirm_expense_category
+)
+
+# Merchant keys kept in the in-process LRU
+MEMO_SIZE = 20000
+
+# Bump whenever merchant_key() changes, so cached entries are not reused
+KEY_VERSION = 2
+
+# Parts of a description that vary between visits to the same merchant. The
+# lookahead lets the scan skip positions no branch can start at.
+_VOLATILE = re.compile(r"""
+    (?=[\d#x*])
+    (?:
+    \d{1,4}[/.-]\d{1,2}(?:[/.-]\d{2,4})?(?!\d)   # dates: 17/09, 2024-09-17
+  | (?<!\w)(?:[x*]{2,}[\s-]?)+\d*(?![a-z])       # card masks: xxxx1234, **** 1234
+  | \#\s*\d+                                     # store numbers: #1234
+  | \d{3,}                                       # reference / terminal numbers
+    )
+""", re.VERBOSE)
+
+_lock = threading.Lock()
+_memo = OrderedDict()   # (rules version, merchant key) -> (category, provider)
+_stats = {'memo_hits': 0, 'db_hits': 0, 'misses': 0}
+
+def classifier_version():
+    """
+    Version of everything classify_many() depends on: the keyword rules,
+    merchant_key() and, once one has been trained, the learned model.
+    """
+    version = f'{categorizer.RULES_VERSION}.{KEY_VERSION}'
+    model_version = learned_categorizer.model_version()
+    if model_version is None:
+        return version
+    return f'{version}+{model_version}'
+
+def merchant_key(description):
+    """
+    Normalize a description to its merchant.
+
+    Lowercases and strips dates, card masks, store numbers and runs of three
+    or more digits ("7-eleven" survives). Falls back to the lowercased
+    description if nothing is left.
+    """
+    lowered = description.lower()
+    key = ' '.join(_VOLATILE.sub(' ', lowered).split())
+    return key or ' '.join(lowered.split())
+
+def classify(description):
+    """
+    Cached categorizer.classify_expense() of the description's merchant key.
+
+    Returns:
+        tuple: (category, provider)
+    """
+    return classify_many([description])[0]
+
+def classify_many(descriptions):
+    """
+    Cached classification of a whole column of descriptions.
+
+    Descriptions are reduced to distinct merchant keys; keys missing from
+    the LRU are fetched from SQLite in one query, and the remaining keys are
+    classified together with categorizer.classify_many() (falling back to
+    one learned_categorizer.predict_many() batch for 'miscellaneous') and
+    stored in one write.
+
+    Args:
+        descriptions (iterable): Expense descriptions
+
+    Returns:
+        list: (category, provider) per description
+    """
+    version = classifier_version()
+    descriptions = list(descriptions)
+    keys = {description: merchant_key(description) for description in dict.fromkeys(descriptions)}
+
+    results = {}
+    with _lock:
+        for merchant in dict.fromkeys(keys.values()):
+            result = _memo.get((version, merchant))
+            if result is not None:
+                _memo.move_to_end((version, merchant))
+                results[merchant] = result
+        _stats['memo_hits'] += len(results)
+
+    pending = [merchant for merchant in dict.fromkeys(keys.values()) if merchant not in results]
+    stored = get_merchant_categories(pending, version) if pending else {}
+
+    missing = [merchant for merchant in pending if merchant not in stored]
+    if missing:
+        categories, providers = categorizer.classify_many(missing)
+        unresolved = [i for i, category in enumerate(categories) if category == 'miscellaneous']
+        if unresolved:
+            learned = learned_categorizer.predict_many([missing[i] for i in unresolved])
+            for i, category in zip(unresolved, learned):
+                if category is not None:
+                    categories[i] = category
+        classified = dict(zip(missing, zip(categories, providers)))
+        put_merchant_categories(
+            [(merchant, *result) for merchant, result in classified.items()], version
+        )
+    else:
+        classified = {}
+
+    with _lock:
+        _stats['db_hits'] += len(stored)
+        _stats['misses'] += len(classified)
+        for merchant, result in (*stored.items(), *classified.items()):
+            _memo[(version, merchant)] = result
+            _memo.move_to_end((version, merchant))
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+    results.update(stored)
+    results.update(classified)
+    return [results[keys[description]] for description in descriptions]
+
+def confirm_category(expense_id, category):
+    """
+    Record a user-confirmed category for an expense and its merchant.
+
+    The expense and the merchant's cache entry (SQLite and LRU) are updated
+    together, so later uploads of the same merchant get the corrected
+    category without retraining.
+
+    Returns:
+        bool: True if the expense exists
+    """
+    version = classifier_version()
+    entry = confirm_expense_category(expense_id, category, merchant_key, version)
+    if entry is None:
+        return False
+    merchant, category, provider = entry
+    with _lock:
+        _memo[(version, merchant)] = (category, provider)
+        _memo.move_to_end((version, merchant))
+    return True
+
+def clear_memo():
+    """Empty the in-process LRU (the SQLite tier is kept)."""
+    with _lock:
+        _memo.clear()
+
+def stats():
+    """Lookup counters for this process and the LRU size."""
+    with _lock:
+        return dict(_stats, memo_size=len(_memo))
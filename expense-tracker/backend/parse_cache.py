@@ -0,0 +1,158 @@
+"""
+Content-addressed cache of parsed statement files.
+
+Entries are keyed by the SHA-256 of the file bytes plus the file type and
+parser version, and hold the normalized parsed rows as JSON on local disk.
+The cache is bounded by total size; the least recently used entries are
+evicted first (an entry's mtime is its last use).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache', 'parse')
+
+# Total size the cache may grow to before old entries are evicted
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Bytes read at a time when hashing a file on disk
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+def cache_key(file_content, extension, parser_version):
+    """Key for a file: SHA-256 of its bytes, type and parser version."""
+    digest = hashlib.sha256(file_content).hexdigest()
+    return f'{digest}-{extension}-v{parser_version}'
+
+def file_cache_key(path, extension, parser_version):
+    """
+    cache_key() of a file on disk, hashed in blocks without reading it
+    into memory. Matches cache_key() of the same bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return f'{digest.hexdigest()}-{extension}-v{parser_version}'
+
+def _entry_path(key, directory):
+    return os.path.join(directory, f'{key}.json')
+
+def _count(stat):
+    with _lock:
+        _stats[stat] += 1
+
+def get(key, directory=None):
+    """
+    Look up a cached parse result.
+
+    Returns:
+        dict: The stored entry, or None on a miss
+    """
+    path = _entry_path(key, directory or CACHE_DIR)
+    try:
+        with open(path, encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        _count('misses')
+        return None
+
+    # Mark as recently used for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    _count('hits')
+    return entry
+
+def put(key, entry, directory=None, max_bytes=None):
+    """
+    Store a parse result, then evict old entries beyond ``max_bytes``.
+
+    Args:
+        key (str): From cache_key()
+        entry (dict): JSON-serializable parse result
+    """
+    directory = directory or CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first so readers never see partial entries
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, _entry_path(key, directory))
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    _count('stores')
+
+    evict(directory, MAX_CACHE_BYTES if max_bytes is None else max_bytes)
+
+def evict(directory=None, max_bytes=None):
+    """
+    Remove least recently used entries until the cache fits ``max_bytes``.
+
+    Returns:
+        int: Number of entries removed
+    """
+    directory = directory or CACHE_DIR
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    total = 0
+    with os.scandir(directory) as it:
+        for item in it:
+            if not item.name.endswith('.json'):
+                continue
+            try:
+                stat = item.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, item.path))
+            total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+
+    if removed:
+        with _lock:
+            _stats['evictions'] += removed
+    return removed
+
+def stats(directory=None):
+    """
+    Cache counters for this process, plus the current size on disk.
+
+    Returns:
+        dict: hits, misses, stores, evictions, hit_rate, entries, bytes
+    """
+    directory = directory or CACHE_DIR
+    with _lock:
+        result = dict(_stats)
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+
+    entries = 0
+    size = 0
+    if os.path.isdir(directory):
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.name.endswith('.json'):
+                    entries += 1
+                    size += item.stat().st_size
+    result['entries'] = entries
+    result['bytes'] = size
+    return result
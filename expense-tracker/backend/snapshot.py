@@ -0,0 +1,220 @@
+"""
+Columnar snapshots of the expenses table.
+
+A snapshot is a directory of raw little-endian column files plus a
+meta.json describing them:
+
+    id.bin        int64    expense id (ascending)
+    day.bin       int32    days since 1970-01-01
+    credit.bin    float64
+    debit.bin     float64
+    category.bin  int32    index into meta['dictionaries']['category']
+    person.bin    int32    index into meta['dictionaries']['person']
+    provider.bin  int32    index into meta['dictionaries']['provider']
+
+load_snapshot() memory-maps the files, so opening one costs no copies and
+NumPy scans millions of rows in milliseconds:
+
+    snap = load_snapshot()
+    dining = snap['dictionaries']['category'].index('dining')
+    spent = snap['debit'][snap['category'] == dining].sum()
+
+Snapshots refresh incrementally: rows with an id above the recorded
+high-water mark are appended. If rows at or below the mark were deleted,
+the snapshot is rebuilt. Rows updated in place (e.g. re-categorized) are
+only picked up by a full rebuild; invalidate_snapshot() marks the snapshot
+so that the next export rebuilds it.
+"""
+import json
+import os
+
+import numpy as np
+
+import database
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), 'snapshots', 'expenses')
+
+SNAPSHOT_FORMAT = 1
+
+# Column name -> dtype, in file order
+COLUMNS = {
+    'id': np.dtype('<i8'),
+    'day': np.dtype('<i4'),
+    'credit': np.dtype('<f8'),
+    'debit': np.dtype('<f8'),
+    'category': np.dtype('<i4'),
+    'person': np.dtype('<i4'),
+    'provider': np.dtype('<i4'),
+}
+
+# Columns stored as codes into a per-snapshot dictionary
+DICTIONARY_COLUMNS = ('category', 'person', 'provider')
+
+def _column_path(directory, column):
+    return os.path.join(directory, f'{column}.bin')
+
+def _read_meta(directory):
+    """Return the snapshot metadata, or None if there is no usable snapshot."""
+    try:
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != SNAPSHOT_FORMAT:
+        return None
+    return meta
+
+def _write_meta(directory, meta):
+    """Write metadata atomically so readers never see a half-written file."""
+    path = os.path.join(directory, 'meta.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+def _empty_meta():
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'rows': 0,
+        'high_water_mark': 0,
+        'dictionaries': {column: [] for column in DICTIONARY_COLUMNS}
+    }
+
+def _is_current(meta):
+    """Whether rows up to the high-water mark are unchanged in the database."""
+    if meta.get('stale'):
+        return False
+    conn = database.get_connection()
+    count = conn.execute(
+        'SELECT COUNT(*) FROM expenses WHERE id <= ?', (meta['high_water_mark'],)
+    ).fetchone()[0]
+    return count == meta['rows']
+
+def invalidate_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Mark the snapshot for a full rebuild on the next export.
+
+    Call after updating rows in place. The snapshot stays loadable (with
+    the old values) until then.
+    """
+    meta = _read_meta(directory)
+    if meta is not None and not meta.get('stale'):
+        meta['stale'] = True
+        _write_meta(directory, meta)
+
+def _encode_batch(rows, meta, lookups):
+    """Convert a batch of sqlite rows into one array per column."""
+    arrays = {
+        'id': np.fromiter((row['id'] for row in rows), COLUMNS['id'], len(rows)),
+        'day': np.array([row['date'] for row in rows], dtype='datetime64[D]')
+                 .astype(COLUMNS['day']),
+        'credit': np.fromiter((row['credit'] or 0.0 for row in rows), COLUMNS['credit'], len(rows)),
+        'debit': np.fromiter((row['debit'] or 0.0 for row in rows), COLUMNS['debit'], len(rows)),
+    }
+    for column in DICTIONARY_COLUMNS:
+        lookup = lookups[column]
+        values = meta['dictionaries'][column]
+        codes = np.empty(len(rows), COLUMNS[column])
+        for i, row in enumerate(rows):
+            value = row[column] if row[column] is not None else 'Unknown'
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(values)
+                values.append(value)
+            codes[i] = code
+        arrays[column] = codes
+    return arrays
+
+def export_snapshot(directory=SNAPSHOT_DIR, full=False, batch_size=50000):
+    """
+    Write or refresh the columnar snapshot of the expenses table.
+
+    Args:
+        directory (str): Snapshot directory (created if missing)
+        full (bool): Rebuild from scratch instead of appending new rows
+        batch_size (int): Rows read from SQLite per batch
+
+    Returns:
+        dict: {'rows': total rows, 'appended': rows added, 'full': rebuilt?}
+    """
+    os.makedirs(directory, exist_ok=True)
+    meta = None if full else _read_meta(directory)
+    if meta is not None and not _is_current(meta):
+        meta = None
+    rebuilt = meta is None
+    if rebuilt:
+        meta = _empty_meta()
+        # Invalidate any previous snapshot before its files are overwritten
+        try:
+            os.remove(os.path.join(directory, 'meta.json'))
+        except FileNotFoundError:
+            pass
+
+    lookups = {
+        column: {value: code for code, value in enumerate(meta['dictionaries'][column])}
+        for column in DICTIONARY_COLUMNS
+    }
+
+    # Drop anything past the recorded row count (an interrupted export)
+    files = {}
+    for column, dtype in COLUMNS.items():
+        f = open(_column_path(directory, column), 'wb' if rebuilt else 'r+b')
+        f.truncate(meta['rows'] * dtype.itemsize)
+        f.seek(0, os.SEEK_END)
+        files[column] = f
+
+    appended = 0
+    try:
+        conn = database.get_connection()
+        cursor = conn.execute('''
+            SELECT id, date, credit, debit, category, person, provider
+            FROM expenses WHERE id > ? ORDER BY id
+        ''', (meta['high_water_mark'],))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            arrays = _encode_batch(rows, meta, lookups)
+            for column, f in files.items():
+                f.write(arrays[column].tobytes())
+            appended += len(rows)
+            meta['high_water_mark'] = int(arrays['id'][-1])
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta['rows'] += appended
+    _write_meta(directory, meta)
+    return {'rows': meta['rows'], 'appended': appended, 'full': rebuilt}
+
+def load_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Memory-map a snapshot written by export_snapshot().
+
+    Returns:
+        dict: One read-only array per entry in COLUMNS, plus 'dictionaries'
+        (column -> list of values for the codes), 'rows' and
+        'high_water_mark'
+    """
+    meta = _read_meta(directory)
+    if meta is None:
+        raise FileNotFoundError(f"No expense snapshot in {directory}")
+
+    snapshot = {
+        'dictionaries': meta['dictionaries'],
+        'rows': meta['rows'],
+        'high_water_mark': meta['high_water_mark']
+    }
+    for column, dtype in COLUMNS.items():
+        if meta['rows'] == 0:
+            snapshot[column] = np.empty(0, dtype)
+        else:
+            snapshot[column] = np.memmap(
+                _column_path(directory, column), dtype=dtype, mode='r',
+                shape=(meta['rows'],)
+            )
+    return snapshot
+
+def days_to_dates(days):
+    """Convert snapshot day numbers back to numpy datetime64[D] values."""
+    return np.asarray(days).astype('datetime64[D]')
@@ -0,0 +1,72 @@
+import sys
+import os
+import random
+import tempfile
+
+# Add current directory to path so we can import merchant_cache
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import categorizer
+import file_parser
+import merchant_cache
+
+# Run against a scratch database so the real merchant cache is untouched
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'merchant_check.db')
+database.init_db()
+
+text_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf_text.txt')
+with open(text_path, encoding='utf-8') as f:
+    sample = f.read()
+year_ctx = file_parser._statement_year(sample)
+descriptions = [
+    expense['description'] for expense in file_parser._parse_statement_text(sample, year_ctx)
+]
+
+# Variants of one merchant that differ only in their volatile parts, plus
+# words that merely contain mask-like letters
+descriptions += [
+    'BAR123 SYDNEY', 'BAR SYDNEY', 'EXXON MOBIL 1234', 'EXXON MOBIL 5678',
+    'XXL SPORTS', 'STARBUCKS #1234 17/09', 'STARBUCKS #99', 'CARD xxxx1234 COLES',
+    'CARD **** 5678 COLES', '7-ELEVEN 2231',
+]
+
+print(f"Checking merchant cache on {len(descriptions)} descriptions: {database.DB_PATH}")
+
+# Uncached: the keyword rules applied to each description's merchant key
+expected = list(zip(*categorizer.classify_many(
+    [merchant_cache.merchant_key(description) for description in descriptions]
+)))
+
+shuffled = descriptions[:]
+random.Random(0).shuffle(shuffled)
+
+runs = {}
+runs['cold (classified)'] = merchant_cache.classify_many(descriptions)
+runs['warm (in-process LRU)'] = merchant_cache.classify_many(descriptions)
+merchant_cache.clear_memo()
+runs['SQLite tier'] = merchant_cache.classify_many(descriptions)
+
+# Classifying in another order from an empty cache must not change answers
+database.clear_merchant_cache()
+merchant_cache.clear_memo()
+by_description = dict(zip(shuffled, merchant_cache.classify_many(shuffled)))
+runs['cold, shuffled order'] = [by_description[description] for description in descriptions]
+
+failed = False
+for name, results in runs.items():
+    mismatches = [
+        (description, result, want)
+        for description, result, want in zip(descriptions, results, expected)
+        if result != want
+    ]
+    print(f"{name}: {len(mismatches)} mismatches")
+    for description, result, want in mismatches[:5]:
+        print(f"  {description!r}: got {result}, expected {want}")
+    failed = failed or bool(mismatches)
+
+if failed:
+    print("\nVERIFICATION FAILED: cached results differ from uncached ones.")
+    sys.exit(1)
+
+print("\nVERIFICATION SUCCESSFUL: cached results match uncached ones in every tier and order.")
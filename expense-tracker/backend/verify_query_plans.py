@@ -0,0 +1,28 @@
+import sys
+import os
+import tempfile
+
+# Add current directory to path so we can import database
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import database
+
+# Run against a scratch copy of the schema so the real database is untouched
+database.DB_PATH = os.path.join(tempfile.mkdtemp(), 'plan_check.db')
+database.init_db()
+
+print(f"Checking query plans against: {database.DB_PATH}")
+
+for name, (sql, params) in database.HOT_QUERIES.items():
+    plan = database.explain_query_plan(sql, params)
+    by_design = " (full scan by design)" if name in database.FULL_SCANS_BY_DESIGN else ""
+    print(f"\n{name}:{by_design}")
+    for line in plan:
+        print(f"  {line}")
+
+offenders = database.find_full_scans()
+if offenders:
+    print(f"\nVERIFICATION FAILED: full table scan or sort in {', '.join(sorted(offenders))}")
+    sys.exit(1)
+
+print("\nVERIFICATION SUCCESSFUL: hot queries are index-backed and unsorted (full scans only by design).")
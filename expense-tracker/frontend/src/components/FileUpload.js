@@ -1,6 +1,6 @@
 import React, { useCallback, useState } from 'react';
 import { useDropzone } from 'react-dropzone';
-import { uploadFile } from '../services/api';
+import { uploadFile, uploadFiles } from '../services/api';
 import './FileUpload.css';
 
 const FileUpload = ({ onUploadSuccess }) => {
@@ -10,13 +10,21 @@ const FileUpload = ({ onUploadSuccess }) => {
   const onDrop = useCallback(async (acceptedFiles) => {
     if (acceptedFiles.length === 0) return;
 
-    const file = acceptedFiles[0];
+    const [file] = acceptedFiles;
+    const isBatch = acceptedFiles.length > 1 || file.name.toLowerCase().endsWith('.zip');
     setUploading(true);
     setMessage('');
 
     try {
-      const result = await uploadFile(file);
-      setMessage(`✓ Success! Processed ${result.count} expenses for ${result.person}`);
+      const result = isBatch ? await uploadFiles(acceptedFiles) : await uploadFile(file);
+      const skipped = result.duplicates ? ` (${result.duplicates} duplicates skipped)` : '';
+      if (isBatch) {
+        const failed = result.files.filter((f) => f.error);
+        const errors = failed.map((f) => `${f.filename}: ${f.error}`).join('; ');
+        setMessage(`✓ Success! Processed ${result.count} expenses from ${result.files.length - failed.length} files${skipped}${errors ? ` ✗ ${errors}` : ''}`);
+      } else {
+        setMessage(`✓ Success! Processed ${result.count} expenses for ${result.person}${skipped}`);
+      }
 
       // Call parent callback to refresh data
       if (onUploadSuccess) {
@@ -38,9 +46,10 @@ const FileUpload = ({ onUploadSuccess }) => {
       'text/csv': ['.csv'],
       'application/pdf': ['.pdf'],
       'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
-      'application/vnd.ms-excel': ['.xls']
+      'application/vnd.ms-excel': ['.xls'],
+      'application/zip': ['.zip']
     },
-    multiple: false,
+    multiple: true,
     disabled: uploading
   });
 
@@ -54,15 +63,15 @@ const FileUpload = ({ onUploadSuccess }) => {
         {uploading ? (
           <div className="upload-message">
             <div className="spinner"></div>
-            <p>Processing file...</p>
+            <p>Processing files...</p>
           </div>
         ) : isDragActive ? (
-          <p>Drop the file here...</p>
+          <p>Drop the files here...</p>
         ) : (
           <div className="upload-prompt">
-            <p className="upload-title">📁 Drop your expense file here</p>
+            <p className="upload-title">📁 Drop your expense files here</p>
             <p className="upload-subtitle">or click to browse</p>
-            <p className="upload-formats">Supports CSV, PDF, XLSX</p>
+            <p className="upload-formats">Supports CSV, PDF, XLSX, or a ZIP of them</p>
           </div>
         )}
       </div>
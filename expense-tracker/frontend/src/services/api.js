@@ -9,7 +9,27 @@ const api = axios.create({
   },
 });
 
-export const uploadFile = async (file) => {
+// How often to check on a queued upload (ms)
+const JOB_POLL_INTERVAL = 500;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Poll a background job until it finishes. Resolves with the job's result;
+// rejects with the job's error if it failed.
+export const waitForJob = async (jobId, onProgress = null) => {
+  for (;;) {
+    const response = await api.get(`/jobs/${jobId}`);
+    const job = response.data;
+    if (job.status === 'done') return job.result;
+    if (job.status === 'failed') throw new Error(job.error);
+    if (onProgress) onProgress(job);
+    await sleep(JOB_POLL_INTERVAL);
+  }
+};
+
+// Upload a statement and wait for it to be processed. Resolves with
+// { message, count, duplicates, person, warnings }.
+export const uploadFile = async (file, onProgress = null) => {
   const formData = new FormData();
   formData.append('file', file);
 
@@ -19,13 +39,36 @@ export const uploadFile = async (file) => {
     },
   });
 
-  return response.data;
+  return waitForJob(response.data.job_id, onProgress);
 };
 
-export const getExpenses = async (startDate = null, endDate = null) => {
+// Upload several statements (or ZIP archives of them) in one batch and wait
+// for them to be processed. Resolves with { message, count, duplicates,
+// files }, where files has per-file counts, parse times and errors.
+export const uploadFiles = async (files, onProgress = null) => {
+  const formData = new FormData();
+  files.forEach((file) => formData.append('files', file));
+
+  const response = await axios.post(`${API_BASE_URL}/upload/batch`, formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  });
+
+  return waitForJob(response.data.job_id, onProgress);
+};
+
+// Fetch one page of expenses. Pass the previous response's next_cursor as
+// options.cursor to fetch the following page.
+export const getExpenses = async (startDate = null, endDate = null, options = {}) => {
   const params = {};
   if (startDate) params.start_date = startDate;
   if (endDate) params.end_date = endDate;
+  ['limit', 'cursor', 'person', 'category', 'provider'].forEach((key) => {
+    if (options[key]) params[key] = options[key];
+  });
+  if (options.fields) params.fields = options.fields.join(',');
+  if (options.includeTotal) params.include_total = '1';
 
   const response = await api.get('/expenses', { params });
   return response.data;